@@ -0,0 +1,119 @@
+"""
+Measures the start up time of the testatrice command line.
+
+Every command is run several times in a fresh interpreter and compared to
+the start up time of an empty interpreter. The run fails if a command imports
+one of the slow dependencies it does not need, or if its median overhead
+exceeds ``--max-overhead`` milliseconds.
+
+Usage: ``python benchmarks/cli_startup.py [--runs 20] [--max-overhead 100]``
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+_REPOSITORY_PATH: str = os.path.dirname(os.path.dirname(__file__)) or "."
+
+# Commands that never talk to podman, with the modules they must not import.
+_COMMANDS: dict[str, tuple[list[str], tuple[str, ...]]] = {
+    "--help": (["--help"], ("podman", "jinja2", "faker")),
+    "server --help": (["server", "--help"], ("podman", "jinja2", "faker")),
+    "stop --help": (["stop", "--help"], ("podman", "jinja2", "faker")),
+    "build --help": (["build", "--help"], ("podman", "jinja2", "faker")),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the start up time of the testatrice command line."
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=20,
+        help="Number of runs per command (default: 20)",
+    )
+    parser.add_argument(
+        "--max-overhead",
+        type=float,
+        default=100,
+        help="Maximum median time added to an empty interpreter start up, in milliseconds (default: 100)",
+    )
+    args = parser.parse_args()
+
+    baseline = median_time(["-c", "pass"], args.runs)
+    print(f"{'python -c pass':<28}{baseline:8.1f} ms")
+
+    failures = []
+    for name, (command, forbidden_modules) in _COMMANDS.items():
+        arguments = ["-m", "testatrice", *command]
+        median = median_time(arguments, args.runs)
+        overhead = median - baseline
+        print(
+            f"{'testatrice ' + name:<28}{median:8.1f} ms  (+{overhead:.1f} ms)"
+        )
+
+        if overhead > args.max_overhead:
+            failures.append(
+                f"testatrice {name} adds {overhead:.1f} ms, more than {args.max_overhead} ms."
+            )
+
+        imported = imported_modules(arguments) & set(forbidden_modules)
+        if imported:
+            failures.append(
+                f"testatrice {name} imports {', '.join(sorted(imported))}."
+            )
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+
+    sys.exit(1 if failures else 0)
+
+
+def median_time(arguments: list[str], runs: int) -> float:
+    """
+    Returns the median wall time of ``python [arguments]``, in milliseconds.
+    """
+    times = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *arguments],
+            cwd=_REPOSITORY_PATH,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        times.append((time.perf_counter() - started_at) * 1000)
+
+    return statistics.median(times)
+
+
+def imported_modules(arguments: list[str]) -> set[str]:
+    """
+    Returns the top level packages imported by ``python [arguments]``.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        cwd=_REPOSITORY_PATH,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            modules.add(name.split(".")[0])
+
+    return modules
+
+
+if __name__ == "__main__":
+    main()
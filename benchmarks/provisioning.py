@@ -0,0 +1,305 @@
+"""
+Measures how long it takes to provision the testatrice environment and
+servers.
+
+Every run destroys the environment and measures a cold ``build_environment``
+(images present, containers stopped), a warm one (everything running), then
+starts and stops servers at each concurrency level, and finally measures
+``destroy_environment``. Nothing is downloaded unless ``--recreate`` is
+passed, so once the images exist the suite runs offline.
+
+The percentiles of every phase are printed, and written as JSON with
+``--output`` so that runs can be compared, for example with ``--baseline``.
+
+Usage: ``python benchmarks/provisioning.py [--runs 5] [--concurrency 1 8 32]
+[--output results.json] [--baseline previous.json]``
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from testatrice import TestServer
+from testatrice.__main__ import enum_choices
+
+_PERCENTILES: tuple[int, ...] = (50, 90, 99)
+# Containers are removed asynchronously once stopped.
+_REMOVAL_TIMEOUT: float = 60
+_REMOVAL_POLL_INTERVAL: float = 0.1
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the provisioning time of the testatrice environment and servers."
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Number of runs (default: 5)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 8, 32],
+        help="Numbers of servers started and stopped at the same time (default: 1 8 32)",
+    )
+    parser.add_argument(
+        "--database-profile",
+        **enum_choices(TestServer.DatabaseProfile),
+        default=TestServer.DatabaseProfile.DEFAULT,
+        help="The database profile of the environment (default: default)",
+    )
+    parser.add_argument(
+        "--database-provisioning",
+        **enum_choices(TestServer.DatabaseProvisioning),
+        default=TestServer.DatabaseProvisioning.RENDER,
+        help="How the servers create their tables (default: render)",
+    )
+    parser.add_argument(
+        "--recreate",
+        action="store_true",
+        default=False,
+        help="Rebuild the images in the first cold build, which needs network access.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write the results to this JSON file.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="A JSON file written by a previous run, to compare the medians with.",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="Write the timed provisioning phases of all runs to this file in Chrome trace format.",
+    )
+    args = parser.parse_args()
+
+    samples: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+
+    def record(phase: str, seconds: float):
+        samples.setdefault(phase, []).append(seconds)
+
+    max_servers = max(args.concurrency)
+    with TestServer.Session(max_pool_size=max(max_servers, 10)) as session:
+        for run in range(args.runs):
+            print(f"Run {run + 1}/{args.runs}...", file=sys.stderr)
+
+            TestServer.destroy_environment(session=session, stop_timeout=0)
+            wait_for_removal(session)
+            for phase in ("cold", "warm"):
+                started_at = time.perf_counter()
+                TestServer.build_environment(
+                    session.client,
+                    recreate=args.recreate and run == 0 and phase == "cold",
+                    database_profile=args.database_profile,
+                    max_servers=max_servers,
+                )
+                record(
+                    f"build_environment.{phase}",
+                    time.perf_counter() - started_at,
+                )
+
+            for concurrency in args.concurrency:
+                run_servers(
+                    session,
+                    concurrency,
+                    args.database_provisioning,
+                    record,
+                    errors,
+                )
+
+            started_at = time.perf_counter()
+            TestServer.destroy_environment(session=session)
+            record("destroy_environment", time.perf_counter() - started_at)
+            wait_for_removal(session)
+
+    results = {
+        "metadata": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "runs": args.runs,
+            "concurrency": args.concurrency,
+            "database_profile": args.database_profile.value,
+            "database_provisioning": args.database_provisioning.value,
+        },
+        "phases": {
+            phase: summarize(values) for phase, values in samples.items()
+        },
+        "errors": errors,
+    }
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["phases"]
+
+    print_results(results["phases"], baseline)
+    for phase, count in errors.items():
+        print(f"FAIL: {count} error(s) in {phase}.", file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.trace is not None:
+        TestServer.Logger.export_chrome_trace(args.trace)
+
+    sys.exit(1 if errors else 0)
+
+
+def run_servers(
+    session: TestServer.Session,
+    concurrency: int,
+    database_provisioning: TestServer.DatabaseProvisioning,
+    record,
+    errors: dict[str, int],
+):
+    """
+    Starts ``concurrency`` servers at the same time, then stops them at the
+    same time, and records the duration of each call and the time to ready
+    of each server.
+    """
+    servers = [
+        TestServer(
+            session=session, database_provisioning=database_provisioning
+        )
+        for _ in range(concurrency)
+    ]
+
+    def timed(phase: str, function):
+        started_at = time.perf_counter()
+        try:
+            function()
+        except Exception as exception:
+            print(f"{phase}: {exception}", file=sys.stderr)
+            errors[phase] = errors.get(phase, 0) + 1
+            return False
+
+        record(phase, time.perf_counter() - started_at)
+        return True
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = list(
+            executor.map(
+                lambda server: timed(f"start@{concurrency}", server.start),
+                servers,
+            )
+        )
+        for server, ok in zip(servers, started):
+            if ok:
+                record(f"time_to_ready@{concurrency}", server.time_to_ready)
+
+        list(
+            executor.map(
+                lambda server: timed(f"stop@{concurrency}", server.stop),
+                [server for server, ok in zip(servers, started) if ok],
+            )
+        )
+
+    for server, ok in zip(servers, started):
+        if not ok:
+            server._release_ports()
+
+    # The ports of the servers are released on stop, but stay bound until
+    # their containers are removed.
+    wait_for_removal(session, [server.container_name for server in servers])
+
+
+def wait_for_removal(session: TestServer.Session, names: list[str] = None):
+    """
+    Waits until the containers named ``names``, or all the testatrice
+    containers, are removed, so that the next measurement does not race
+    with them for names and ports.
+
+    Raises:
+        TimeoutError: If they still exist after ``_REMOVAL_TIMEOUT`` seconds.
+    """
+    deadline = time.monotonic() + _REMOVAL_TIMEOUT
+    while True:
+        remaining = [
+            container.name
+            for container in session.client.containers.list(all=True)
+            if (
+                container.name in names
+                if names is not None
+                else container.name.startswith("testatrice-")
+            )
+        ]
+        if not remaining:
+            return
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Containers still exist after {_REMOVAL_TIMEOUT} seconds: {', '.join(remaining)}"
+            )
+        time.sleep(_REMOVAL_POLL_INTERVAL)
+
+
+def summarize(values: list[float]) -> dict:
+    """
+    Returns the count, mean, percentiles and extremes of ``values``, in
+    seconds, with the samples themselves.
+    """
+    ordered = sorted(values)
+    summary = {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "min": ordered[0],
+        "max": ordered[-1],
+    }
+    for percentile in _PERCENTILES:
+        summary[f"p{percentile}"] = nearest_rank(ordered, percentile)
+    summary["samples"] = values
+
+    return summary
+
+
+def nearest_rank(ordered: list[float], percentile: float) -> float:
+    """
+    Returns the nearest-rank ``percentile`` of the sorted list ``ordered``.
+    """
+    rank = math.ceil(percentile / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def print_results(phases: dict[str, dict], baseline: dict[str, dict] = None):
+    header = f"{'phase':<28}{'n':>5}" + "".join(
+        f"{f'p{percentile}':>10}" for percentile in _PERCENTILES
+    )
+    header += f"{'max':>10}"
+    if baseline is not None:
+        header += f"{'p50 change':>12}"
+    print(header)
+
+    for phase, summary in phases.items():
+        line = f"{phase:<28}{summary['count']:>5}" + "".join(
+            f"{summary[f'p{percentile}']:>9.3f}s"
+            for percentile in _PERCENTILES
+        )
+        line += f"{summary['max']:>9.3f}s"
+        if baseline is not None and phase in baseline:
+            change = summary["p50"] / baseline[phase]["p50"] - 1
+            line += f"{change:>+11.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
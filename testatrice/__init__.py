@@ -1,3 +1,44 @@
-from .testatrice import TestServer
+# The public classes are imported on first access, so importing the package,
+# for example to run the command line, does not import podman and jinja2.
+_EXPORTS = {
+    "AsyncTestServer": ".async_server",
+    "LoadGenerator": ".loadgen",
+    "LoadReport": ".loadgen",
+    "ResourceSample": ".resources",
+    "ResourceSampler": ".resources",
+    "LogLine": ".logfiles",
+    "SeedPlan": ".seeding",
+    "SqlError": ".sql",
+    "SqlExecutionError": ".sql",
+    "TestServer": ".testatrice",
+    "TestServerPool": ".pool",
+}
 
-__all__ = ["TestServer"]
+__all__ = [
+    "AsyncTestServer",
+    "LoadGenerator",
+    "LoadReport",
+    "ResourceSample",
+    "ResourceSampler",
+    "LogLine",
+    "SeedPlan",
+    "SqlError",
+    "SqlExecutionError",
+    "TestServer",
+    "TestServerPool",
+]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import importlib
+
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
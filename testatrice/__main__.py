@@ -1,7 +1,6 @@
 import argparse
 import pathlib
-
-import podman
+from enum import Enum
 
 from testatrice import TestServer
 
@@ -11,17 +10,29 @@ def main():
     args = parser.parse_args()
 
     if args.verbose and not args.silent:
-        TestServer.Logger.enable()
+        TestServer.Logger.enable(
+            TestServer.Logger.Level.DEBUG
+            if args.verbose > 1
+            else TestServer.Logger.Level.INFO
+        )
 
-    match args.command:
-        case "server":
-            server(args)
-        case "build-environment" | "build":
-            build_environment(args)
-        case "stop":
-            stop(args)
-        case None:
-            parser.print_help()
+    try:
+        match args.command:
+            case "server":
+                server(args)
+            case "build-environment" | "build":
+                build_environment(args)
+            case "stop":
+                stop(args)
+            case None:
+                parser.print_help()
+    finally:
+        trace = getattr(args, "trace", None)
+        if trace is not None:
+            if trace.suffix == ".jsonl":
+                TestServer.Logger.export_json_lines(trace)
+            else:
+                TestServer.Logger.export_chrome_trace(trace)
 
 
 def generate_parser():
@@ -47,9 +58,9 @@ def generate_parser():
     verbose = [
         ("-v", "--verbose"),
         {
-            "action": "store_true",
-            "help": "Print more logging information.",
-            "default": False,
+            "action": "count",
+            "help": "Print more logging information. Repeat to also print the output of the image builds.",
+            "default": 0,
         },
     ]
     silent = [
@@ -68,6 +79,48 @@ def generate_parser():
             "default": None,
         },
     ]
+    database_profile = [
+        ("--database-profile",),
+        {
+            **enum_choices(TestServer.DatabaseProfile),
+            "help": "How the database stores its data: default (stock MariaDB durability) or ephemeral (data directory on tmpfs, InnoDB tuned for throughput, lost when the database stops). Only applied when the database container is created (default: default)",
+            "default": TestServer.DatabaseProfile.DEFAULT,
+        },
+    ]
+    max_servers = [
+        ("--max-servers",),
+        {
+            "type": int,
+            "help": "Number of servers expected to run at the same time, used to size the database connection limit (default: 100)",
+            "default": 100,
+        },
+    ]
+    database_buffer_pool_size = [
+        ("--database-buffer-pool-size",),
+        {
+            "type": str,
+            "help": "InnoDB buffer pool size of the ephemeral database profile, such as 512M or 2G (default: 512M)",
+            "default": "512M",
+        },
+    ]
+
+    database_shards = [
+        ("--database-shards",),
+        {
+            "type": int,
+            "help": "Number of database containers servers are spread across. Running shards are kept until the environment is destroyed (default: 1)",
+            "default": 1,
+        },
+    ]
+
+    trace = [
+        ("--trace",),
+        {
+            "type": pathlib.Path,
+            "help": "Write the timed events of the provisioning phases to this file when done, as JSON lines if it ends with .jsonl, in Chrome trace format otherwise (default: not written)",
+            "default": None,
+        },
+    ]
 
     parser.add_argument(*verbose[0], **verbose[1])
     parser.add_argument(*silent[0], **silent[1])
@@ -85,6 +138,12 @@ def generate_parser():
         help="Used as part of the container's name, as the database tables prefix, as the log file name, and as part of the email from (default: chosen randomly)",
         default=None,
     )
+    general_group.add_argument(
+        "--identifier-style",
+        help="How the server identifier is generated if none is given: compact (such as t0tn0v4800avu0) or word (a random English word followed by a unique suffix) (default: compact)",
+        **enum_choices(TestServer.IdentifierStyle),
+        default=TestServer.IdentifierStyle.COMPACT,
+    )
     general_group.add_argument(
         "-t",
         "--tcp-port",
@@ -108,18 +167,49 @@ def generate_parser():
     )
     general_group.add_argument(
         "--ini-template",
-        type=argparse.FileType("r"),
+        type=pathlib.Path,
         help="Path to the Jinja2 template for the server's ini file (default: testatrice.ini.j2 provided with the package)",
         default=None,
     )
     general_group.add_argument(
         "--sql-template",
-        type=argparse.FileType("r"),
+        type=pathlib.Path,
         help="Path to the Jinja2 template for the database's SQL file (default: testatrice.sql.j2 provided with the package)",
         default=None,
     )
+    general_group.add_argument(
+        "--readiness-probe",
+        help="How to detect that servatrice is ready: tcp (a TCP session is accepted), websocket (a WebSocket handshake completes) or log (servatrice logs that it is listening) (default: websocket)",
+        **enum_choices(TestServer.ReadinessProbe),
+        default=TestServer.ReadinessProbe.WEBSOCKET,
+    )
+    general_group.add_argument(
+        "--readiness-timeout",
+        type=float,
+        help="Maximum time to wait for servatrice to be ready, in seconds (default: 30)",
+        default=30,
+    )
+    general_group.add_argument(
+        "--database-provisioning",
+        help="How to create the server's database tables: render (run the rendered SQL template) or clone (copy a template schema created once per SQL template) (default: render)",
+        **enum_choices(TestServer.DatabaseProvisioning),
+        default=TestServer.DatabaseProvisioning.RENDER,
+    )
+    general_group.add_argument(
+        "--database-placement",
+        help="How the server is assigned to a database shard: hash (from the server identifier) or least-loaded (the shard used by the fewest running servers) (default: hash)",
+        **enum_choices(TestServer.DatabasePlacement),
+        default=TestServer.DatabasePlacement.HASH,
+    )
     general_group.add_argument(*deb_path[0], **deb_path[1])
+    general_group.add_argument(*database_profile[0], **database_profile[1])
+    general_group.add_argument(*max_servers[0], **max_servers[1])
+    general_group.add_argument(
+        *database_buffer_pool_size[0], **database_buffer_pool_size[1]
+    )
+    general_group.add_argument(*database_shards[0], **database_shards[1])
     general_group.add_argument(*recreate[0], **recreate[1])
+    general_group.add_argument(*trace[0], **trace[1])
     general_group.add_argument(*verbose[0], **verbose[1])
     general_group.add_argument(*silent[0], **silent[1])
 
@@ -150,12 +240,8 @@ def generate_parser():
     servatrice_configuration_group.add_argument(
         "-am",
         "--authentication-method",
-        type=TestServer.AuthenticationMethod,
         help="valid values: none|password|sql (default: sql)",
-        choices=[
-            authentication_method.value
-            for authentication_method in TestServer.AuthenticationMethod
-        ],
+        **enum_choices(TestServer.AuthenticationMethod),
         default=TestServer.AuthenticationMethod.SQL,
     )
     servatrice_configuration_group.add_argument(
@@ -292,9 +378,8 @@ def generate_parser():
     servatrice_configuration_group.add_argument(
         "-ro",
         "--rooms-method",
-        type=TestServer.RoomMethod,
         help="Source for rooms information (default: config)",
-        choices=[room_method.value for room_method in TestServer.RoomMethod],
+        **enum_choices(TestServer.RoomMethod),
         default=TestServer.RoomMethod.CONFIG,
     )
     servatrice_configuration_group.add_argument(
@@ -312,7 +397,18 @@ def generate_parser():
         aliases=["build"],
     )
     parser_build_environment.add_argument(*deb_path[0], **deb_path[1])
+    parser_build_environment.add_argument(
+        *database_profile[0], **database_profile[1]
+    )
+    parser_build_environment.add_argument(*max_servers[0], **max_servers[1])
+    parser_build_environment.add_argument(
+        *database_buffer_pool_size[0], **database_buffer_pool_size[1]
+    )
+    parser_build_environment.add_argument(
+        *database_shards[0], **database_shards[1]
+    )
     parser_build_environment.add_argument(*recreate[0], **recreate[1])
+    parser_build_environment.add_argument(*trace[0], **trace[1])
     parser_build_environment.add_argument(*verbose[0], **verbose[1])
     parser_build_environment.add_argument(*silent[0], **silent[1])
 
@@ -323,6 +419,12 @@ def generate_parser():
     )
     parser_stop.add_argument(*verbose[0], **verbose[1])
     parser_stop.add_argument(*silent[0], **silent[1])
+    parser_stop.add_argument(
+        "--stop-timeout",
+        type=int,
+        help="Seconds each container is given to stop before it is killed, 0 kills them right away. Applies to --servers and --all (default: 1)",
+        default=1,
+    )
     parser_stop_group = parser_stop.add_argument_group(
         "Targets (include only one)"
     )
@@ -352,9 +454,23 @@ def generate_parser():
     return parser
 
 
+def enum_choices(enum: type[Enum]) -> dict:
+    """
+    Returns the ``add_argument`` keyword arguments for an option taking the
+    values of ``enum``. argparse checks the converted value against
+    ``choices``, so they must be the members and not their values.
+    """
+    return {
+        "type": enum,
+        "choices": list(enum),
+        "metavar": "{" + ",".join(member.value for member in enum) + "}",
+    }
+
+
 def server(args):
     test_server = TestServer(
         server_identifier=args.server_identifier,
+        identifier_style=args.identifier_style,
         tcp_port=args.tcp_port,
         websocket_port=args.websocket_port,
         require_client_id=args.require_client_id,
@@ -381,6 +497,12 @@ def server(args):
         rooms_method=args.rooms_method,
         max_game_inactivity_time=args.max_game_inactivity_time,
         log_path=args.log_path,
+        readiness_probe=args.readiness_probe,
+        readiness_timeout=args.readiness_timeout,
+        database_provisioning=args.database_provisioning,
+        database_placement=args.database_placement,
+        ini_template=args.ini_template,
+        sql_template=args.sql_template,
     )
     build_environment(args)
     test_server.start()
@@ -393,28 +515,30 @@ def server(args):
             "websocket_port": test_server.websocket_port,
             "websocket_url": test_server.ws_url,
             "log_path": test_server.log_path,
+            "time_to_ready": test_server.time_to_ready,
         }
 
         print(print_values)
 
 
 def build_environment(args):
-    with podman.PodmanClient() as podman_client:
-        if not podman_client.ping():
-            message = "The podman service did not respond."
-            TestServer.Logger.log(message)
-            raise ConnectionError(message)
-
+    with TestServer.Session() as session:
         TestServer.build_environment(
-            podman_client, recreate=args.recreate, deb_path=args.deb_path
+            session.client,
+            recreate=args.recreate,
+            deb_path=args.deb_path,
+            database_profile=args.database_profile,
+            max_servers=args.max_servers,
+            database_buffer_pool_size=args.database_buffer_pool_size,
+            database_shards=args.database_shards,
         )
 
 
 def stop(args):
     if args.all:
-        TestServer.destroy_environment()
+        TestServer.destroy_environment(stop_timeout=args.stop_timeout)
     elif args.servers:
-        TestServer.stop_all_server_containers()
+        TestServer.stop_all_server_containers(stop_timeout=args.stop_timeout)
     elif args.server_identifier is not None:
         try:
             TestServer.stop_server(args.server_identifier)
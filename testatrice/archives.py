@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import io
+import os
+import tarfile
+import tempfile
+import time
+from typing import BinaryIO
+
+
+def archive_file(name: str, content: str | bytes) -> bytes:
+    """
+    Returns a tar archive holding a single file named ``name``, to be
+    uploaded to a container with ``put_archive``.
+    """
+    data = content.encode() if isinstance(content, str) else content
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = 0o644
+    info.mtime = int(time.time())
+
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w") as tar:
+        tar.addfile(info, io.BytesIO(data))
+
+    return archive.getvalue()
+
+
+def archive_path(name: str, path: str | os.PathLike) -> BinaryIO:
+    """
+    Returns a temporary file holding a tar archive with a single file named
+    ``name``, copied from the file at ``path`` in chunks, so large files are
+    never held in memory. It can be passed to ``put_archive`` and is deleted
+    when closed.
+    """
+    archive = tempfile.TemporaryFile()
+    try:
+        with open(path, "rb") as source:
+            info = tarfile.TarInfo(name)
+            info.size = os.fstat(source.fileno()).st_size
+            info.mode = 0o644
+            info.mtime = int(time.time())
+            with tarfile.open(fileobj=archive, mode="w") as tar:
+                tar.addfile(info, source)
+    except BaseException:
+        archive.close()
+        raise
+
+    archive.seek(0)
+    return archive
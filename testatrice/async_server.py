@@ -0,0 +1,321 @@
+import asyncio
+import functools
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator
+
+import podman
+
+from . import logfiles, readiness, resources
+from .testatrice import TestServer
+
+
+class AsyncTestServer:
+    """
+    The asyncio interface to run testatrice instances in podman containers.
+
+    It accepts the same keyword arguments as ``TestServer`` and exposes the
+    same attributes, read from the wrapped ``server``. Podman calls run in a
+    dedicated thread pool and the readiness probes use asyncio sockets, so
+    any number of servers can be started or stopped at once with
+    ``asyncio.gather``.
+
+    Unless a ``session`` other than None is passed, all instances share a single
+    ``TestServer.Session``, opened on first use and closed with
+    ``AsyncTestServer.disconnect``.
+
+    Raises:
+        ValueError: If either of ``tcp_port`` or ``websocket_port`` is already
+          in use.
+    """
+
+    _MAX_WORKERS: int = 64
+    # The number of log lines read ahead of the consumer of ``logs``.
+    _LOG_QUEUE_SIZE: int = 1000
+
+    _executor: ThreadPoolExecutor = None
+    _session = TestServer.Session(max_pool_size=_MAX_WORKERS)
+
+    def __init__(self, **server_arguments):
+        # The coroutines use the session's connection, so an explicit None
+        # also means the shared session.
+        if server_arguments.get("session") is None:
+            server_arguments["session"] = AsyncTestServer._session
+        self.server = TestServer(**server_arguments)
+
+    def __getattr__(self, name: str):
+        # Attributes are read from the server, so they follow it when
+        # starting replaces its generated identifier.
+        if name == "server":
+            raise AttributeError(name)
+        return getattr(self.server, name)
+
+    async def start(self):
+        """
+        Starts this testatrice-server instance. The environment must already
+        be built (see ``AsyncTestServer.build_environment``).
+
+        If servatrice does not get ready, the container is stopped and its
+        ports are released before the error is raised.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            RuntimeError: If a container using this same identifier already
+              exists.
+            TimeoutError: If servatrice is not ready within
+              ``readiness_timeout`` seconds.
+        """
+        podman_client = await self.__connect()
+        await AsyncTestServer._run(self.server._start, podman_client)
+        try:
+            await self.__wait_until_ready(podman_client)
+        except BaseException:
+            await AsyncTestServer._run(self.server._abort_start, podman_client)
+            raise
+
+    async def reset(self, restart: bool = True):
+        """
+        See ``TestServer.reset``.
+        """
+        podman_client = await self.__connect()
+        await AsyncTestServer._run(
+            self.server._reset, podman_client, restart=restart
+        )
+        if restart:
+            await self.__wait_until_ready(podman_client)
+
+    async def snapshot(self, name: str, cache: bool = False):
+        """
+        See ``TestServer.snapshot``.
+        """
+        await AsyncTestServer._run(self.server.snapshot, name, cache=cache)
+
+    async def restore(self, name: str, restart: bool = True):
+        """
+        See ``TestServer.restore``.
+        """
+        podman_client = await self.__connect()
+        await AsyncTestServer._run(
+            self.server._restore, podman_client, name, restart=restart
+        )
+        if restart:
+            await self.__wait_until_ready(podman_client)
+
+    async def logs(
+        self,
+        follow: bool = False,
+        since: datetime = None,
+        offset: int = 0,
+    ) -> AsyncIterator[logfiles.LogLine]:
+        """
+        See ``TestServer.logs``. Lines are read by a dedicated thread, so the
+        event loop is never blocked by a slow log. Closing or cancelling the
+        iterator stops tail in the container, which ends the thread.
+        """
+        podman_client = await self.__connect()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(AsyncTestServer._LOG_QUEUE_SIZE)
+        stopped = threading.Event()
+        stoppers = []
+
+        def started(stop):
+            stoppers.append(stop)
+            if stopped.is_set():
+                stop()
+
+        def put(item) -> bool:
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    queue.put(item), loop
+                ).result()
+            except RuntimeError:
+                # The event loop is closed.
+                return False
+            return not stopped.is_set()
+
+        def feed():
+            lines = self.server._logs(
+                podman_client,
+                follow=follow,
+                since=since,
+                offset=offset,
+                started=started,
+            )
+            try:
+                for line in lines:
+                    if not put(line):
+                        return
+                put(None)
+            except Exception as exception:
+                put(exception)
+            finally:
+                lines.close()
+
+        thread = threading.Thread(
+            target=feed, name="testatrice-async-logs", daemon=True
+        )
+        thread.start()
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+            # Makes room for a line the thread may be waiting to put.
+            while not queue.empty():
+                queue.get_nowait()
+            if thread.is_alive():
+                for stop in list(stoppers):
+                    await AsyncTestServer._run(stop)
+
+    async def wait_for_log(
+        self,
+        pattern: str | re.Pattern,
+        timeout: float = 30,
+        offset: int = 0,
+    ) -> logfiles.LogLine:
+        """
+        See ``TestServer.wait_for_log``.
+        """
+        return await AsyncTestServer._run(
+            self.server.wait_for_log, pattern, timeout=timeout, offset=offset
+        )
+
+    def sample_resources(
+        self, interval: int = 1, capacity: int = 3600
+    ) -> resources.ResourceSampler:
+        """
+        See ``TestServer.sample_resources``. Sampling runs in its own thread,
+        so this does not block the event loop.
+        """
+        return self.server.sample_resources(interval, capacity)
+
+    async def __wait_until_ready(self, podman_client: podman.PodmanClient):
+        match self.server.readiness_probe:
+            case TestServer.ReadinessProbe.TCP:
+                ready = await readiness.async_wait_until(
+                    lambda: readiness.async_probe_tcp(
+                        "localhost", self.tcp_port
+                    ),
+                    self.server.readiness_timeout,
+                )
+                self.server._record_readiness(ready)
+            case TestServer.ReadinessProbe.WEBSOCKET:
+                ready = await readiness.async_wait_until(
+                    lambda: readiness.async_probe_websocket(
+                        "localhost", self.websocket_port
+                    ),
+                    self.server.readiness_timeout,
+                )
+                self.server._record_readiness(ready)
+            case TestServer.ReadinessProbe.LOG:
+                await AsyncTestServer._run(
+                    self.server._wait_until_ready, podman_client
+                )
+
+    async def stop(self):
+        """
+        Stops this testatrice-server instance.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            RuntimeError: If a container using this same identifier does not
+              exist or is not running.
+        """
+        podman_client = await self.__connect()
+        await AsyncTestServer._run(self.server._stop, podman_client)
+
+    @staticmethod
+    async def build_environment(
+        recreate: bool = False, deb_path: str = None, **environment_arguments
+    ) -> dict[str, float | None]:
+        """
+        See ``TestServer.build_environment``.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+        """
+        podman_client = await AsyncTestServer.connect()
+        return await AsyncTestServer._run(
+            TestServer.build_environment,
+            podman_client,
+            recreate=recreate,
+            deb_path=deb_path,
+            **environment_arguments,
+        )
+
+    @staticmethod
+    async def stop_all_server_containers(
+        stop_timeout: int = TestServer._STOP_TIMEOUT, owned_only: bool = False
+    ) -> None:
+        """
+        See ``TestServer.stop_all_server_containers``.
+        """
+        podman_client = await AsyncTestServer.connect()
+        await AsyncTestServer._run(
+            TestServer._stop_all_server_containers,
+            podman_client,
+            stop_timeout=stop_timeout,
+            owned_only=owned_only,
+        )
+
+    @staticmethod
+    async def destroy_environment(
+        stop_timeout: int = TestServer._STOP_TIMEOUT, owned_only: bool = False
+    ) -> None:
+        """
+        See ``TestServer.destroy_environment``.
+        """
+        podman_client = await AsyncTestServer.connect()
+        await AsyncTestServer._run(
+            TestServer._destroy_environment,
+            podman_client,
+            stop_timeout=stop_timeout,
+            owned_only=owned_only,
+        )
+        AsyncTestServer._session.invalidate()
+
+    @staticmethod
+    async def connect() -> podman.PodmanClient:
+        """
+        Returns the podman connection shared by all instances, opening it if
+        necessary.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+        """
+        return await AsyncTestServer._run(
+            lambda: AsyncTestServer._session.client
+        )
+
+    @staticmethod
+    async def disconnect() -> None:
+        """
+        Closes the podman connection shared by all instances. It is opened
+        again on next use.
+        """
+        await AsyncTestServer._run(AsyncTestServer._session.close)
+
+    async def __connect(self) -> podman.PodmanClient:
+        return await AsyncTestServer._run(lambda: self.server._session.client)
+
+    @staticmethod
+    async def _run(function, *args, **kwargs):
+        if AsyncTestServer._executor is None:
+            AsyncTestServer._executor = ThreadPoolExecutor(
+                max_workers=AsyncTestServer._MAX_WORKERS,
+                thread_name_prefix="testatrice-async",
+            )
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            AsyncTestServer._executor,
+            functools.partial(function, *args, **kwargs),
+        )
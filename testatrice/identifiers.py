@@ -0,0 +1,61 @@
+import functools
+import itertools
+import os
+import string
+import time
+
+_ALPHABET: str = string.digits + string.ascii_lowercase
+
+# The process start time and id have a fixed width, so the variable length
+# counter at the end can not make two identifiers equal.
+_TIME_WIDTH: int = 7
+_PID_WIDTH: int = 5
+
+_counter = itertools.count()
+_started_at: int = int(time.time())
+
+
+def compact() -> str:
+    """
+    Returns an identifier that is unique on this host while the process
+    runs: it is made of the start time of the process, its id and a counter.
+    A later process started in the same second with the same id generates
+    the same identifiers, so callers check that they are unused. It starts
+    with a letter and only contains lowercase letters and digits, so it is
+    valid in container names, host names and SQL identifiers.
+    """
+    return (
+        "t"
+        + _base36(_started_at, _TIME_WIDTH)
+        + _base36(os.getpid(), _PID_WIDTH)
+        + _base36(next(_counter))
+    )
+
+
+def word() -> str:
+    """
+    Returns a random English word followed by a compact unique suffix.
+    Imports Faker on first use.
+    """
+    word = "".join(
+        character
+        for character in _faker().word().lower()
+        if character.isalnum()
+    )
+    return word + compact()[1:]
+
+
+def _base36(number: int, width: int = 1) -> str:
+    digits = []
+    while number:
+        number, digit = divmod(number, 36)
+        digits.append(_ALPHABET[digit])
+
+    return "".join(reversed(digits)).rjust(width, "0")
+
+
+@functools.cache
+def _faker():
+    from faker import Faker
+
+    return Faker()
@@ -0,0 +1,545 @@
+"""
+Drives simulated Cockatrice clients against a servatrice instance to measure
+its capacity.
+
+Every simulated client opens its own TCP or WebSocket session, logs in,
+lists the rooms, joins some of them, then chats, creates games and pings at
+the configured rates until the end of the run. The latency of every command
+and every error is recorded in a ``LoadReport``. Sessions run on asyncio, and
+a run can be split across several processes when a single core cannot keep
+up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import random
+import time
+from array import array
+from enum import Enum
+from typing import TYPE_CHECKING, Iterator
+
+from . import passwords, protocol
+
+if TYPE_CHECKING:
+    from .testatrice import TestServer
+
+_USER_PREFIX: str = "lg"
+_CLIENT_VERSION: str = "testatrice-loadgen"
+_ACCOUNTS_PER_STATEMENT: int = 1000
+
+
+class LoadReport:
+    """
+    The results of a load run. Reports of runs made at the same time, for
+    example in different processes, are combined with ``merge``.
+
+    Attributes:
+        duration (float): The duration of the run, in seconds.
+        sessions (int): The number of sessions that logged in.
+        failed_sessions (int): The number of sessions that could not connect
+          or log in.
+        latencies (dict[str, array]): The latencies of the successful
+          commands, in seconds, by command.
+        errors (dict[str, int]): The number of errors by command and cause,
+          such as ``room_say: response 18`` or ``login: timeout``.
+    """
+
+    def __init__(self):
+        self.duration: float = 0
+        self.sessions: int = 0
+        self.failed_sessions: int = 0
+        self.latencies: dict[str, array] = {}
+        self.errors: dict[str, int] = {}
+
+    def record(self, command: str, latency: float) -> None:
+        if command not in self.latencies:
+            self.latencies[command] = array("d")
+        self.latencies[command].append(latency)
+
+    def record_error(self, error: str) -> None:
+        self.errors[error] = self.errors.get(error, 0) + 1
+
+    def merge(self, other: LoadReport) -> None:
+        """
+        Adds the results of ``other``, a run made at the same time.
+        """
+        self.duration = max(self.duration, other.duration)
+        self.sessions += other.sessions
+        self.failed_sessions += other.failed_sessions
+        for command, latencies in other.latencies.items():
+            self.latencies.setdefault(command, array("d")).extend(latencies)
+        for error, count in other.errors.items():
+            self.errors[error] = self.errors.get(error, 0) + count
+
+    @property
+    def commands(self) -> int:
+        """
+        The number of successful commands.
+        """
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    def throughput(self, command: str = None) -> float:
+        """
+        Returns the number of successful commands per second, of all
+        commands or of ``command`` only.
+        """
+        if not self.duration:
+            return 0
+        if command is None:
+            return self.commands / self.duration
+        return len(self.latencies.get(command, ())) / self.duration
+
+    def percentile(self, command: str, percentile: float) -> float | None:
+        """
+        Returns the nearest-rank ``percentile`` of the latencies of
+        ``command``, in seconds, or None if it never succeeded.
+        """
+        latencies = sorted(self.latencies.get(command, ()))
+        if not latencies:
+            return None
+        rank = math.ceil(percentile / 100 * len(latencies))
+        return latencies[max(rank, 1) - 1]
+
+    def to_dict(self) -> dict:
+        """
+        Returns the report as a JSON serializable dictionary, with the
+        percentiles of every command instead of its latencies.
+        """
+        return {
+            "duration": self.duration,
+            "sessions": self.sessions,
+            "failed_sessions": self.failed_sessions,
+            "throughput": self.throughput(),
+            "commands": {
+                command: {
+                    "count": len(latencies),
+                    "throughput": self.throughput(command),
+                    **{
+                        f"p{percentile}": self.percentile(command, percentile)
+                        for percentile in (50, 90, 99)
+                    },
+                    "max": max(latencies),
+                }
+                for command, latencies in self.latencies.items()
+            },
+            "errors": dict(self.errors),
+        }
+
+    def __str__(self) -> str:
+        lines = [
+            f"{self.sessions} sessions ({self.failed_sessions} failed), "
+            f"{self.commands} commands in {self.duration:.1f} s "
+            f"({self.throughput():.1f}/s)",
+            f"{'command':<14}{'count':>9}{'rate/s':>10}"
+            f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}",
+        ]
+        for command, latencies in self.latencies.items():
+            lines.append(
+                f"{command:<14}{len(latencies):>9}"
+                f"{self.throughput(command):>10.1f}"
+                + "".join(
+                    f"{self.percentile(command, percentile) * 1000:>10.1f}"
+                    for percentile in (50, 90, 99)
+                )
+            )
+        for error, count in sorted(self.errors.items()):
+            lines.append(f"error: {error} x{count}")
+
+        return "\n".join(lines)
+
+
+class LoadGenerator:
+    """
+    Simulates Cockatrice clients against the servatrice at ``host:port``.
+
+    Use ``for_server`` to target a ``TestServer`` with accounts matching its
+    authentication method.
+
+    Arguments:
+        host (str): The host servatrice listens on.
+        port (int): The TCP or WebSocket port, matching ``transport``.
+        transport (Transport): The protocol of the sessions.
+        sessions (int): The number of simulated clients.
+        accounts (list[tuple[str, str]]): The user name and password of every
+          session, reused if there are fewer accounts than sessions. The
+          password is None to log in without one. Defaults to distinct
+          names without password, for the ``none`` authentication method.
+        duration (float): The number of seconds every session keeps sending
+          commands once the ramp up is over.
+        ramp_up (float): The number of seconds over which the sessions are
+          opened, at a constant rate.
+        rooms (int): The number of rooms every session joins, among the ones
+          servatrice lists.
+        chat_rate (float): The room messages sent per second per session.
+        game_rate (float): The games created per second per session.
+        ping_rate (float): The pings sent per second per session.
+        client_features (list[str]): The features advertised on login, which
+          must include the ``required_features`` of servatrice.
+        command_timeout (float): The number of seconds after which a command
+          without response is counted as an error.
+        seed (int): The seed of the random intervals between commands, so
+          runs with the same settings send the same sequence.
+    """
+
+    class Transport(Enum):
+        TCP = "tcp"
+        WEBSOCKET = "websocket"
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 4747,
+        transport: Transport = Transport.TCP,
+        sessions: int = 100,
+        accounts: list[tuple[str, str | None]] = None,
+        duration: float = 30,
+        ramp_up: float = 5,
+        rooms: int = 1,
+        chat_rate: float = 0.2,
+        game_rate: float = 0.02,
+        ping_rate: float = 0.1,
+        client_features: list[str] = (),
+        command_timeout: float = 10,
+        seed: int = 0,
+    ):
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.sessions = sessions
+        self.accounts = accounts or [
+            (f"{_USER_PREFIX}{index:06d}", None) for index in range(sessions)
+        ]
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.rooms = rooms
+        self.chat_rate = chat_rate
+        self.game_rate = game_rate
+        self.ping_rate = ping_rate
+        self.client_features = list(client_features)
+        self.command_timeout = command_timeout
+        self.seed = seed
+        self._first_session = 0
+
+    @staticmethod
+    def for_server(
+        server: TestServer,
+        transport: Transport = Transport.TCP,
+        sessions: int = 100,
+        **generator_arguments,
+    ) -> LoadGenerator:
+        """
+        Returns a load generator for the started ``server``. Its accounts
+        match the authentication method of the server: distinct names for
+        ``none``, distinct names with the common password for ``password``,
+        and accounts created in the server's database with
+        ``create_accounts`` for ``sql``.
+        """
+        # AsyncTestServer wraps a TestServer.
+        server = getattr(server, "server", server)
+        variables = server._template_variables
+
+        match variables["authentication_method"]:
+            case "sql":
+                accounts = create_accounts(server, sessions)
+            case "password":
+                accounts = [
+                    (
+                        f"{_USER_PREFIX}{index:06d}",
+                        variables["common_password"],
+                    )
+                    for index in range(sessions)
+                ]
+            case _:
+                accounts = None
+
+        generator_arguments.setdefault(
+            "client_features",
+            [
+                feature.strip()
+                for feature in variables["required_features"].split(",")
+                if feature.strip()
+            ],
+        )
+
+        return LoadGenerator(
+            port=(
+                server.websocket_port
+                if transport == LoadGenerator.Transport.WEBSOCKET
+                else server.tcp_port
+            ),
+            transport=transport,
+            sessions=sessions,
+            accounts=accounts,
+            **generator_arguments,
+        )
+
+    async def run(self) -> LoadReport:
+        """
+        Runs all the sessions in the running event loop and returns their
+        report.
+        """
+        report = LoadReport()
+        started_at = time.monotonic()
+        deadline = started_at + self.ramp_up + self.duration
+
+        async def session(index: int):
+            await asyncio.sleep(index * self.ramp_up / max(self.sessions, 1))
+            await _Session(self, self._first_session + index, report).run(
+                deadline
+            )
+
+        await asyncio.gather(
+            *(session(index) for index in range(self.sessions))
+        )
+        report.duration = time.monotonic() - started_at
+
+        return report
+
+    def run_processes(self, processes: int = os.cpu_count()) -> LoadReport:
+        """
+        Splits the sessions across ``processes`` processes, each running its
+        own event loop, and returns their combined report.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+
+        processes = max(1, min(processes, self.sessions))
+        generators = []
+        first_session = 0
+        for process in range(processes):
+            generator = LoadGenerator.__new__(LoadGenerator)
+            generator.__dict__.update(self.__dict__)
+            generator.sessions = self.sessions // processes + (
+                process < self.sessions % processes
+            )
+            generator._first_session = first_session
+            first_session += generator.sessions
+            generators.append(generator)
+
+        report = LoadReport()
+        # Forking a process that holds podman connections and threads is
+        # unsafe, so the workers are spawned.
+        with ProcessPoolExecutor(
+            max_workers=processes, mp_context=get_context("spawn")
+        ) as executor:
+            for process_report in executor.map(_run_generator, generators):
+                report.merge(process_report)
+
+        return report
+
+
+class _Session:
+    def __init__(
+        self, generator: LoadGenerator, index: int, report: LoadReport
+    ):
+        self._generator = generator
+        self._index = index
+        self._report = report
+        self._random = random.Random(generator.seed * 1000003 + index)
+        self._connection: protocol.Connection = None
+        self._pending: dict[int, asyncio.Future] = {}
+        self._rooms: asyncio.Future = None
+        self._next_cmd_id = 0
+
+    async def run(self, deadline: float):
+        generator = self._generator
+        user_name, password = generator.accounts[
+            self._index % len(generator.accounts)
+        ]
+
+        try:
+            started_at = time.monotonic()
+            if generator.transport == LoadGenerator.Transport.WEBSOCKET:
+                self._connection = await protocol.Connection.open_websocket(
+                    generator.host, generator.port
+                )
+            else:
+                self._connection = await protocol.Connection.open_tcp(
+                    generator.host, generator.port
+                )
+            self._report.record("connect", time.monotonic() - started_at)
+        except (
+            OSError,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+        ) as error:
+            # A connection closed during the WebSocket handshake fails the
+            # session like a refused one, without ending the others.
+            self._report.record_error(f"connect: {error.__class__.__name__}")
+            self._report.failed_sessions += 1
+            return
+
+        self._rooms = asyncio.get_running_loop().create_future()
+        receiver = asyncio.create_task(self.__receive())
+        try:
+            if not await self.__command(
+                "login",
+                lambda cmd_id: protocol.login(
+                    cmd_id,
+                    user_name,
+                    password,
+                    client_id=f"lg{self._index:013d}"[-15:],
+                    client_version=_CLIENT_VERSION,
+                    client_features=generator.client_features,
+                ),
+            ):
+                self._report.failed_sessions += 1
+                return
+            self._report.sessions += 1
+
+            await self.__command("list_rooms", protocol.list_rooms)
+            try:
+                rooms = await asyncio.wait_for(
+                    self._rooms, generator.command_timeout
+                )
+            except asyncio.TimeoutError:
+                self._report.record_error("list_rooms: no room list")
+                rooms = ()
+
+            joined = []
+            for room_id, _ in rooms:
+                if len(joined) >= generator.rooms:
+                    break
+                if await self.__command(
+                    "join_room",
+                    lambda cmd_id: protocol.join_room(cmd_id, room_id),
+                ):
+                    joined.append(room_id)
+
+            await self.__act(joined, deadline)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self._report.record_error("connection closed")
+        finally:
+            receiver.cancel()
+            for future in self._pending.values():
+                future.cancel()
+            await self._connection.close()
+
+    async def __act(self, rooms: list[int], deadline: float):
+        generator = self._generator
+        actions = [("ping", generator.ping_rate)]
+        if rooms:
+            actions += [
+                ("room_say", generator.chat_rate),
+                ("create_game", generator.game_rate),
+            ]
+        now = time.monotonic()
+        schedule = {
+            action: now + self._random.expovariate(rate)
+            for action, rate in actions
+            if rate > 0
+        }
+        rates = dict(actions)
+        sent = 0
+
+        while schedule:
+            action, at = min(schedule.items(), key=lambda item: item[1])
+            if at >= deadline:
+                return
+            await asyncio.sleep(max(0, at - time.monotonic()))
+
+            room_id = self._random.choice(rooms) if rooms else None
+            sent += 1
+            match action:
+                case "ping":
+                    message = protocol.ping
+                case "room_say":
+                    message = lambda cmd_id: protocol.room_say(
+                        cmd_id, room_id, f"load {self._index} {sent}"
+                    )
+                case "create_game":
+                    message = lambda cmd_id: protocol.create_game(
+                        cmd_id, room_id, f"load {self._index} {sent}"
+                    )
+            await self.__command(action, message)
+
+            schedule[action] = max(at, time.monotonic()) + (
+                self._random.expovariate(rates[action])
+            )
+
+    async def __command(self, name: str, message) -> bool:
+        self._next_cmd_id += 1
+        cmd_id = self._next_cmd_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[cmd_id] = future
+
+        started_at = time.monotonic()
+        await self._connection.send(message(cmd_id))
+        try:
+            response_code = await asyncio.wait_for(
+                future, self._generator.command_timeout
+            )
+        except asyncio.TimeoutError:
+            self._report.record_error(f"{name}: timeout")
+            return False
+        finally:
+            self._pending.pop(cmd_id, None)
+
+        if response_code != protocol.RESPONSE_OK:
+            self._report.record_error(f"{name}: response {response_code}")
+            return False
+
+        self._report.record(name, time.monotonic() - started_at)
+        return True
+
+    async def __receive(self):
+        try:
+            while True:
+                message = protocol.parse_server_message(
+                    await self._connection.receive()
+                )
+                if message.cmd_id is not None:
+                    future = self._pending.get(message.cmd_id)
+                    if future is not None and not future.done():
+                        future.set_result(message.response_code)
+                elif (
+                    message.event == protocol.LIST_ROOMS_EVENT
+                    and not self._rooms.done()
+                ):
+                    self._rooms.set_result(message.rooms)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Commands waiting for a response time out.
+            pass
+
+
+def create_accounts(
+    server: TestServer,
+    count: int,
+    password: str = "password",
+    prefix: str = _USER_PREFIX,
+) -> list[tuple[str, str]]:
+    """
+    Creates ``count`` active accounts in the database of ``server``, named
+    ``[prefix][index]`` with the index on 6 digits, all with ``password``.
+    Existing accounts with the same names are kept. Returns their names and
+    passwords.
+    """
+    password_hash = passwords.password_hash(password)
+    names = [f"{prefix}{index:06d}" for index in range(count)]
+
+    server.execute_sql(
+        _account_statements(server.server_identifier, names, password_hash)
+    )
+
+    return [(name, password) for name in names]
+
+
+def _account_statements(
+    server_identifier: str, names: list[str], password_hash: str
+) -> Iterator[str]:
+    for start in range(0, len(names), _ACCOUNTS_PER_STATEMENT):
+        rows = ",".join(
+            f"(0,'{name}','{password_hash}',1)"
+            for name in names[start : start + _ACCOUNTS_PER_STATEMENT]
+        )
+        yield (
+            f"INSERT IGNORE INTO `{server_identifier}_users` "
+            f"(admin,name,password_sha512,active) VALUES {rows}"
+        )
+
+
+def _run_generator(generator: LoadGenerator) -> LoadReport:
+    return asyncio.run(generator.run())
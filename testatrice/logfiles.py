@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import functools
+import re
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Iterator, NamedTuple
+
+if TYPE_CHECKING:
+    import podman
+
+# The shell prints its process id before replacing itself with tail, so a
+# follower closed early can kill tail instead of leaving it running in the
+# container.
+_FOLLOW_SCRIPT: str = 'echo $$; exec "$@"'
+
+# Servatrice prefixes its log lines with QDateTime::toString(), such as
+# "Tue Jan 2 15:04:05 2024".
+_TIMESTAMP_PATTERN: re.Pattern = re.compile(
+    r"^\w{3} \w{3} +\d{1,2} \d{2}:\d{2}:\d{2} \d{4}"
+)
+_TIMESTAMP_FORMAT: str = "%a %b %d %H:%M:%S %Y"
+
+
+class LogLine(NamedTuple):
+    """
+    A line of a log file.
+
+    Attributes:
+        text (str): The line, without the line break.
+        offset (int): The byte offset of the line in the file.
+        next_offset (int): The byte offset right after the line, from which
+          a later read continues.
+    """
+
+    text: str
+    offset: int
+    next_offset: int
+
+
+def read(
+    container: podman.domain.containers.Container,
+    path: str,
+    follow: bool = False,
+    since: datetime = None,
+    offset: int = 0,
+    duration: float = None,
+    started: Callable[[Callable[[], None]], None] = None,
+) -> Iterator[LogLine]:
+    """
+    Yields the lines of the file at ``path`` in ``container``, starting at
+    byte ``offset``.
+
+    The file is streamed by a single exec of tail and split into lines as it
+    arrives, so memory use does not grow with the size of the file. Closing
+    the iterator stops tail.
+
+    Arguments:
+        container: The container holding the file.
+        path: The path of the file in the container.
+        follow: Set to True to wait for new lines after the end of the file,
+          until the container stops or the iterator is closed. The file does
+          not need to exist yet.
+        since: Skip the lines before the first one logged at or after this
+          time. Lines without a timestamp belong to the line before them.
+          Naive datetimes are in the time zone of the container, which is
+          UTC unless configured otherwise.
+        offset: The byte offset to start from, such as the ``next_offset``
+          of the last line read.
+        duration: The maximum number of seconds to follow the file.
+        started: Called with a function stopping tail once it runs, so
+          another thread can stop a reader blocked waiting for new lines.
+
+    Returns:
+        An iterator over the lines. A last line without a line break is only
+        yielded when not following.
+    """
+    command = ["tail", "-c", f"+{offset + 1}"]
+    if follow:
+        command.append("-F")
+    command.append(path)
+    if duration is not None:
+        command = ["timeout", str(duration)] + command
+
+    _, stream = container.exec_run(
+        cmd=["sh", "-c", _FOLLOW_SCRIPT, "sh", *command],
+        stream=True,
+        stderr=False,
+    )
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    process_id = None
+    finished = False
+    skipping = since is not None
+    buffer = bytearray()
+    try:
+        for chunk in stream:
+            buffer += chunk
+            if process_id is None:
+                end = buffer.find(b"\n")
+                if end == -1:
+                    continue
+                process_id = buffer[:end].decode()
+                del buffer[: end + 1]
+                if started is not None:
+                    started(functools.partial(_stop, container, process_id))
+
+            start = 0
+            while (end := buffer.find(b"\n", start)) != -1:
+                text = buffer[start:end].decode(errors="replace")
+                line = LogLine(text, offset, offset + end - start + 1)
+                offset = line.next_offset
+                start = end + 1
+
+                if skipping:
+                    timestamp = parse_timestamp(text)
+                    if timestamp is None or timestamp < since:
+                        continue
+                    skipping = False
+                yield line
+            del buffer[:start]
+        finished = True
+
+        if buffer and not follow and not skipping:
+            yield LogLine(
+                buffer.decode(errors="replace"), offset, offset + len(buffer)
+            )
+    finally:
+        if not finished and process_id is not None:
+            _stop(container, process_id)
+
+
+def parse_timestamp(line: str) -> datetime | None:
+    """
+    Returns the time servatrice logged ``line`` at, or None if the line does
+    not start with a timestamp.
+    """
+    match = _TIMESTAMP_PATTERN.match(line)
+    if match is None:
+        return None
+
+    try:
+        return datetime.strptime(match.group(), _TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def _stop(container: podman.domain.containers.Container, process_id: str):
+    from podman import errors as podman_errors
+
+    try:
+        container.exec_run(cmd=["kill", process_id])
+    except podman_errors.APIError:
+        # The container stopped in the meantime, and tail with it.
+        pass
@@ -0,0 +1,23 @@
+import base64
+import hashlib
+import os
+
+# Servatrice stores the salt in front of the hash.
+_SALT_LENGTH: int = 16
+_HASH_ROUNDS: int = 1000
+
+
+def password_hash(password: str, salt: str = None) -> str:
+    """
+    Returns the ``password_sha512`` column servatrice stores for
+    ``password``: the salt followed by the hash computed by its
+    ``PasswordHasher``. A random salt is used unless ``salt`` is passed.
+    """
+    if salt is None:
+        salt = base64.b64encode(os.urandom(12)).decode()[:_SALT_LENGTH]
+
+    digest = (salt + password).encode()
+    for _ in range(_HASH_ROUNDS):
+        digest = hashlib.sha512(digest).digest()
+
+    return salt + base64.b64encode(digest).decode()
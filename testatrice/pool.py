@@ -0,0 +1,261 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator
+
+from .testatrice import TestServer
+
+
+class TestServerPool:
+    """
+    A pool of started testatrice-server instances sharing the same
+    configuration.
+
+    The pool keeps ``size`` servers started in the background. A server is
+    taken from the pool with ``checkout`` and handed back with ``checkin``.
+    Returned servers are reset in the background (see ``TestServer.reset``)
+    and made available again, so a checkout normally does not wait for a
+    server to start.
+
+    The environment must already be built (see
+    ``TestServer.build_environment``).
+
+    Arguments:
+        size (int): The number of servers kept ready in the pool.
+        refill_workers (int): The maximum number of servers started at the
+          same time in the background. Defaults to ``size``.
+        **server_arguments: Keyword arguments passed to ``TestServer`` for
+          every server in the pool. ``server_identifier``, ``tcp_port`` and
+          ``websocket_port`` are always chosen randomly. Unless a
+          ``session`` is passed, the servers share a session owned by the
+          pool and closed with it.
+
+    Raises:
+        ValueError: If ``size`` is not positive, or if
+          ``server_identifier``, ``tcp_port`` or ``websocket_port`` are
+          passed.
+    """
+
+    _FORBIDDEN_ARGUMENTS = ("server_identifier", "tcp_port", "websocket_port")
+
+    def __init__(
+        self, size: int, refill_workers: int = None, **server_arguments
+    ):
+        if size < 1:
+            raise ValueError("The pool size must be at least 1.")
+
+        for argument in TestServerPool._FORBIDDEN_ARGUMENTS:
+            if server_arguments.get(argument) is not None:
+                raise ValueError(
+                    f"{argument} cannot be set for servers in a pool."
+                )
+
+        self.size = size
+        self._owned_session = None
+        if server_arguments.get("session") is None:
+            self._owned_session = TestServer.Session(
+                max_pool_size=max(size, 10)
+            )
+            server_arguments["session"] = self._owned_session
+        self._server_arguments = server_arguments
+        self._ready: queue.Queue[TestServer | BaseException] = queue.Queue()
+        self._checked_out: set[TestServer] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=refill_workers or size,
+            thread_name_prefix="testatrice-pool",
+        )
+        self._started = False
+        self._closed = False
+
+    def start(self) -> None:
+        """
+        Starts filling the pool in the background. Returns immediately.
+
+        Raises:
+            RuntimeError: If the pool was already started or closed.
+        """
+        with self._lock:
+            if self._started or self._closed:
+                raise RuntimeError("The pool was already started.")
+            self._started = True
+
+        for _ in range(self.size):
+            self._executor.submit(self.__start_server)
+
+    def checkout(self, timeout: float = None) -> TestServer:
+        """
+        Takes a started server out of the pool, waiting for one to be ready
+        if necessary.
+
+        Arguments:
+            timeout (float): The maximum number of seconds to wait for a
+              server. None waits indefinitely.
+
+        Raises:
+            RuntimeError: If the pool is not running, or if starting the
+              server failed in the background.
+            TimeoutError: If no server became ready within ``timeout``.
+        """
+        if not self._started or self._closed:
+            raise RuntimeError("The pool is not running.")
+
+        try:
+            item = self._ready.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No test server became ready within {timeout} seconds."
+            )
+
+        if isinstance(item, BaseException):
+            self.__refill()
+            raise RuntimeError(
+                "A pooled test server failed to start."
+            ) from item
+
+        with self._lock:
+            self._checked_out.add(item)
+
+        return item
+
+    def checkin(self, server: TestServer) -> None:
+        """
+        Returns a server to the pool. The server is reset in the background
+        before it can be checked out again. If the reset fails, the server is
+        stopped and a fresh one is started to replace it. Once the pool is
+        closed, checking in does nothing, since closing the pool stopped the
+        server.
+
+        Raises:
+            ValueError: If ``server`` was not checked out from this pool.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            if server not in self._checked_out:
+                raise ValueError(
+                    f"Test server {server.server_identifier} does not belong to this pool."
+                )
+            self._checked_out.remove(server)
+            # close() shuts the executor down only after setting _closed
+            # under the lock, so it still accepts work here.
+            self._executor.submit(self.__reset_server, server)
+
+    @contextmanager
+    def server(self, timeout: float = None) -> Iterator[TestServer]:
+        """
+        Checks out a server for the duration of a ``with`` block and checks
+        it back in afterwards.
+        """
+        test_server = self.checkout(timeout=timeout)
+        try:
+            yield test_server
+        finally:
+            self.checkin(test_server)
+
+    def close(self) -> None:
+        """
+        Stops every server started by the pool, including the ones still
+        checked out. The pool cannot be used afterwards.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            checked_out = list(self._checked_out)
+            self._checked_out.clear()
+
+        self._executor.shutdown(wait=True)
+
+        while not self._ready.empty():
+            item = self._ready.get_nowait()
+            if isinstance(item, TestServer):
+                checked_out.append(item)
+
+        for test_server in checked_out:
+            TestServerPool.__stop_server(test_server)
+
+        if self._owned_session is not None:
+            self._owned_session.close()
+
+    def __enter__(self) -> "TestServerPool":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __refill(self) -> None:
+        # Checked under the lock, as close() sets _closed under it before
+        # shutting the executor down.
+        with self._lock:
+            if not self._closed:
+                self._executor.submit(self.__start_server)
+
+    def __start_server(self) -> None:
+        if self._closed:
+            return
+
+        test_server = None
+        try:
+            test_server = TestServer(**self._server_arguments)
+            test_server.start()
+        except Exception as exception:
+            TestServer.Logger.log(
+                f"A pooled test server failed to start: {exception}",
+                TestServer.Logger.Level.WARNING,
+            )
+            if test_server is not None:
+                # The container may have been started before the failure,
+                # and the ports are reserved as soon as the server exists.
+                TestServerPool.__abort_server(test_server)
+            self._ready.put(exception)
+            return
+
+        if self._closed:
+            TestServerPool.__stop_server(test_server)
+        else:
+            self._ready.put(test_server)
+
+    def __reset_server(self, test_server: TestServer) -> None:
+        if self._closed:
+            TestServerPool.__stop_server(test_server)
+            return
+
+        try:
+            test_server.reset()
+        except Exception as exception:
+            TestServer.Logger.log(
+                f"Could not reset pooled test server {test_server.server_identifier}, replacing it: {exception}",
+                TestServer.Logger.Level.WARNING,
+            )
+            TestServerPool.__stop_server(test_server)
+            self.__start_server()
+            return
+
+        if self._closed:
+            TestServerPool.__stop_server(test_server)
+        else:
+            self._ready.put(test_server)
+
+    @staticmethod
+    def __abort_server(test_server: TestServer) -> None:
+        try:
+            test_server._abort_start(test_server._session.client)
+        except ConnectionError as exception:
+            test_server._release_ports()
+            TestServer.Logger.log(
+                f"Could not stop pooled test server {test_server.server_identifier}: {exception}",
+                TestServer.Logger.Level.WARNING,
+            )
+
+    @staticmethod
+    def __stop_server(test_server: TestServer) -> None:
+        try:
+            test_server.stop()
+        except (ConnectionError, RuntimeError) as exception:
+            TestServer.Logger.log(
+                f"Could not stop pooled test server {test_server.server_identifier}: {exception}",
+                TestServer.Logger.Level.WARNING,
+            )
@@ -0,0 +1,136 @@
+import errno
+import fcntl
+import os
+import random
+import socket
+import tempfile
+import threading
+
+_LOCK_DIRECTORY: str = os.path.join(tempfile.gettempdir(), "testatrice-ports")
+
+# Below the default Linux ephemeral range (32768-60999), so the kernel does
+# not hand out the same ports to outgoing connections.
+_FIRST_PORT: int = 20000
+_LAST_PORT: int = 32767
+
+
+class PortAllocator:
+    """
+    Reserves host ports across threads and processes.
+
+    A port is reserved by holding an exclusive lock on a lock file named
+    after it, so two reservations, even from different processes, never get
+    the same port. Locks are released by the operating system when their
+    process exits, so a crashed process never leaks ports. A port is only
+    reserved if nothing is bound to it, which also skips the ports still
+    used by containers started by processes that already exited.
+
+    Arguments:
+        first_port (int): The first port of the range.
+        last_port (int): The last port of the range, included.
+        lock_directory (str): The directory holding the lock files. It must be
+          the same for all the processes sharing the range.
+
+    Raises:
+        ValueError: If the range is invalid.
+    """
+
+    def __init__(
+        self,
+        first_port: int = _FIRST_PORT,
+        last_port: int = _LAST_PORT,
+        lock_directory: str = _LOCK_DIRECTORY,
+    ):
+        if not 0 < first_port <= last_port < 65536:
+            raise ValueError(f"Invalid port range {first_port}-{last_port}.")
+
+        self.first_port = first_port
+        self.last_port = last_port
+        self.lock_directory = lock_directory
+        self._locks: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self) -> int:
+        """
+        Reserves a free port of the range and returns it. The search starts at
+        a random port, so concurrent callers rarely contend for the same
+        lock files.
+
+        Raises:
+            RuntimeError: If every port of the range is reserved or in use.
+        """
+        size = self.last_port - self.first_port + 1
+        offset = random.randrange(size)
+        for index in range(size):
+            port = self.first_port + (offset + index) % size
+            if self.__lock(port):
+                if is_port_available(port):
+                    return port
+                self.release(port)
+
+        raise RuntimeError(
+            f"No port is available between {self.first_port} and {self.last_port}."
+        )
+
+    def reserve_port(self, port: int) -> None:
+        """
+        Reserves a specific port, which does not need to be in the range.
+
+        Raises:
+            ValueError: If the port is already reserved or in use.
+        """
+        if not self.__lock(port):
+            raise ValueError(f"Port {port} is already in use.")
+
+        if not is_port_available(port):
+            self.release(port)
+            raise ValueError(f"Port {port} is already in use.")
+
+    def release(self, port: int) -> None:
+        """
+        Releases a port reserved with this allocator. Does nothing if it is
+        not reserved.
+        """
+        with self._lock:
+            descriptor = self._locks.pop(port, None)
+
+        # The lock file is kept: removing it would let another process lock
+        # a file that is no longer the one other processes open.
+        if descriptor is not None:
+            os.close(descriptor)
+
+    def __lock(self, port: int) -> bool:
+        with self._lock:
+            if port in self._locks:
+                return False
+
+        os.makedirs(self.lock_directory, exist_ok=True)
+        descriptor = os.open(
+            os.path.join(self.lock_directory, f"{port}.lock"),
+            os.O_CREAT | os.O_RDWR,
+            0o666,
+        )
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(descriptor)
+            return False
+
+        with self._lock:
+            self._locks[port] = descriptor
+
+        return True
+
+
+def is_port_available(port: int) -> bool:
+    """
+    Returns True if nothing is bound to ``port`` on the host.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("", port))
+            return True
+        except OSError as error:
+            if error.errno == errno.EADDRINUSE:
+                return False
+            raise
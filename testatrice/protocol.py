@@ -0,0 +1,433 @@
+"""
+The subset of the Cockatrice protocol used to simulate clients.
+
+Messages are protobuf, encoded and decoded by hand so that no generated code
+or protobuf runtime is needed. Commands are ``CommandContainer`` messages
+holding a single session or room command, which the Cockatrice protocol
+defines as extensions; servatrice answers with ``ServerMessage`` messages.
+
+Over TCP, every message is prefixed with its length as a 4 byte big endian
+integer. Over WebSocket, every message is a binary frame.
+"""
+
+import asyncio
+import os
+import struct
+from typing import Iterable, NamedTuple
+
+from . import readiness
+
+# CommandContainer fields
+_CMD_ID: int = 1
+_ROOM_ID: int = 20
+_SESSION_COMMAND: int = 100
+_ROOM_COMMAND: int = 102
+
+# SessionCommand extensions
+PING: int = 1000
+LOGIN: int = 1001
+LIST_ROOMS: int = 1014
+JOIN_ROOM: int = 1015
+
+# RoomCommand extensions
+ROOM_SAY: int = 1001
+CREATE_GAME: int = 1002
+
+# ServerMessage fields and message types
+_MESSAGE_TYPE: int = 1
+_RESPONSE: int = 2
+_SESSION_EVENT: int = 3
+RESPONSE_MESSAGE: int = 0
+SESSION_EVENT_MESSAGE: int = 1
+
+# Response fields
+_RESPONSE_CMD_ID: int = 1
+_RESPONSE_CODE: int = 2
+RESPONSE_OK: int = 1
+
+# SessionEvent extensions
+SERVER_IDENTIFICATION: int = 500
+LIST_ROOMS_EVENT: int = 1004
+
+# Event_ListRooms and ServerInfo_Room fields
+_ROOM_LIST: int = 1
+_ROOM_INFO_ID: int = 1
+_ROOM_INFO_NAME: int = 2
+
+_VARINT: int = 0
+_LENGTH_DELIMITED: int = 2
+
+_TCP_HEADER: struct.Struct = struct.Struct(">I")
+_MAX_MESSAGE_SIZE: int = 64 * 1024 * 1024
+
+
+class ServerMessage(NamedTuple):
+    """
+    The parts of a ``ServerMessage`` the simulated clients use.
+
+    Attributes:
+        message_type (int): ``RESPONSE_MESSAGE``, ``SESSION_EVENT_MESSAGE``
+          or another ``ServerMessage.MessageType``.
+        cmd_id (int): The command answered by a response, or None.
+        response_code (int): The ``Response.ResponseCode`` of a response, or
+          None.
+        event (int): The extension number of a session event, such as
+          ``LIST_ROOMS_EVENT``, or None.
+        rooms (tuple[tuple[int, str], ...]): The room ids and names of an
+          ``Event_ListRooms``.
+    """
+
+    message_type: int
+    cmd_id: int | None = None
+    response_code: int | None = None
+    event: int | None = None
+    rooms: tuple[tuple[int, str], ...] = ()
+
+
+def command(
+    cmd_id: int,
+    session_command: int = None,
+    room_command: int = None,
+    room: int = None,
+    **fields,
+) -> bytes:
+    """
+    Returns a ``CommandContainer`` holding either the session command or the
+    room command with the extension number ``session_command`` or
+    ``room_command``, in which case ``room`` is the id of the room. Keyword
+    arguments are the fields of the command, as ``name=(field number,
+    value)``; strings, booleans, integers and lists of integers are
+    supported.
+    """
+    body = b"".join(_field(number, value) for number, value in fields.values())
+    message = _varint_field(_CMD_ID, cmd_id)
+    if session_command is not None:
+        extension = _bytes_field(session_command, body)
+        message += _bytes_field(_SESSION_COMMAND, extension)
+    else:
+        message += _varint_field(_ROOM_ID, room)
+        extension = _bytes_field(room_command, body)
+        message += _bytes_field(_ROOM_COMMAND, extension)
+
+    return message
+
+
+def ping(cmd_id: int) -> bytes:
+    return command(cmd_id, session_command=PING)
+
+
+def login(
+    cmd_id: int,
+    user_name: str,
+    password: str = None,
+    client_id: str = None,
+    client_version: str = None,
+    client_features: Iterable[str] = (),
+) -> bytes:
+    fields = {"user_name": (1, user_name)}
+    if password is not None:
+        fields["password"] = (2, password)
+    if client_id is not None:
+        fields["clientid"] = (3, client_id)
+    if client_version is not None:
+        fields["clientver"] = (4, client_version)
+    for index, feature in enumerate(client_features):
+        fields[f"clientfeatures{index}"] = (5, feature)
+
+    return command(cmd_id, session_command=LOGIN, **fields)
+
+
+def list_rooms(cmd_id: int) -> bytes:
+    return command(cmd_id, session_command=LIST_ROOMS)
+
+
+def join_room(cmd_id: int, room_id: int) -> bytes:
+    return command(cmd_id, session_command=JOIN_ROOM, room_id=(1, room_id))
+
+
+def room_say(cmd_id: int, room_id: int, message: str) -> bytes:
+    return command(
+        cmd_id, room_command=ROOM_SAY, room=room_id, message=(1, message)
+    )
+
+
+def create_game(
+    cmd_id: int,
+    room_id: int,
+    description: str,
+    max_players: int = 2,
+    game_type_ids: list[int] = (),
+) -> bytes:
+    return command(
+        cmd_id,
+        room_command=CREATE_GAME,
+        room=room_id,
+        description=(1, description),
+        max_players=(3, max_players),
+        spectators_allowed=(6, True),
+        game_type_ids=(10, list(game_type_ids)),
+    )
+
+
+def parse_server_message(data: bytes) -> ServerMessage:
+    """
+    Decodes the parts of a ``ServerMessage`` described by ``ServerMessage``.
+
+    Raises:
+        ValueError: If ``data`` is not a valid protobuf message.
+    """
+    fields = _decode(data)
+    message_type = _first(fields, _MESSAGE_TYPE, RESPONSE_MESSAGE)
+
+    if _RESPONSE in fields:
+        response = _decode(fields[_RESPONSE][0])
+        return ServerMessage(
+            message_type,
+            cmd_id=_first(response, _RESPONSE_CMD_ID),
+            response_code=_first(response, _RESPONSE_CODE),
+        )
+
+    if _SESSION_EVENT in fields:
+        session_event = _decode(fields[_SESSION_EVENT][0])
+        # A session event holds a single extension.
+        event = next(
+            (number for number in session_event if number >= 100), None
+        )
+        rooms = []
+        if event == LIST_ROOMS_EVENT:
+            event_fields = _decode(session_event[event][0])
+            for room in event_fields.get(_ROOM_LIST, []):
+                room_fields = _decode(room)
+                rooms.append(
+                    (
+                        _first(room_fields, _ROOM_INFO_ID, 0),
+                        _first(room_fields, _ROOM_INFO_NAME, b"").decode(
+                            errors="replace"
+                        ),
+                    )
+                )
+        return ServerMessage(message_type, event=event, rooms=tuple(rooms))
+
+    return ServerMessage(message_type)
+
+
+class Connection:
+    """
+    A TCP or WebSocket connection to servatrice that sends and receives
+    whole protobuf messages.
+
+    Use ``open_tcp`` or ``open_websocket`` to create one.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        websocket: bool,
+    ):
+        self._reader = reader
+        self._writer = writer
+        self._websocket = websocket
+
+    @staticmethod
+    async def open_tcp(host: str, port: int) -> "Connection":
+        reader, writer = await asyncio.open_connection(host, port)
+        # The official client opens every session with an empty
+        # CommandContainer, which servatrice answers with its
+        # identification event.
+        writer.write(_TCP_HEADER.pack(0))
+        await writer.drain()
+        return Connection(reader, writer, websocket=False)
+
+    @staticmethod
+    async def open_websocket(host: str, port: int) -> "Connection":
+        """
+        Raises:
+            ConnectionError: If the WebSocket handshake is refused.
+            asyncio.IncompleteReadError: If the connection is closed during
+              the handshake.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(readiness._websocket_handshake(host, port))
+        try:
+            await writer.drain()
+            response = await reader.readuntil(b"\r\n\r\n")
+        except (
+            OSError,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+        ):
+            writer.close()
+            raise
+        if not response.startswith(b"HTTP/1.1 101"):
+            writer.close()
+            raise ConnectionError(
+                f"WebSocket handshake refused by {host}:{port}."
+            )
+        return Connection(reader, writer, websocket=True)
+
+    async def send(self, message: bytes) -> None:
+        if self._websocket:
+            self._writer.write(_websocket_frame(0x2, message))
+        else:
+            self._writer.write(_TCP_HEADER.pack(len(message)) + message)
+        await self._writer.drain()
+
+    async def receive(self) -> bytes:
+        """
+        Returns the next message.
+
+        Raises:
+            asyncio.IncompleteReadError: If the connection was closed.
+            ConnectionError: If servatrice closed the WebSocket or sent an
+              invalid frame.
+        """
+        if not self._websocket:
+            header = await self._reader.readexactly(_TCP_HEADER.size)
+            (size,) = _TCP_HEADER.unpack(header)
+            if size > _MAX_MESSAGE_SIZE:
+                raise ConnectionError(f"Message of {size} bytes is too big.")
+            return await self._reader.readexactly(size)
+
+        message = b""
+        while True:
+            first, second = await self._reader.readexactly(2)
+            opcode = first & 0x0F
+            size = second & 0x7F
+            if size == 126:
+                (size,) = struct.unpack(
+                    ">H", await self._reader.readexactly(2)
+                )
+            elif size == 127:
+                (size,) = struct.unpack(
+                    ">Q", await self._reader.readexactly(8)
+                )
+            if size > _MAX_MESSAGE_SIZE:
+                raise ConnectionError(f"Frame of {size} bytes is too big.")
+            payload = await self._reader.readexactly(size)
+
+            match opcode:
+                case 0x8:
+                    raise ConnectionError("The server closed the WebSocket.")
+                case 0x9:
+                    self._writer.write(_websocket_frame(0xA, payload))
+                    continue
+                case 0xA:
+                    continue
+
+            message += payload
+            if first & 0x80:
+                return message
+
+    async def close(self) -> None:
+        try:
+            if self._websocket:
+                self._writer.write(_websocket_frame(0x8, b""))
+            self._writer.close()
+            await self._writer.wait_closed()
+        except OSError:
+            pass
+
+
+def _websocket_frame(opcode: int, payload: bytes) -> bytes:
+    # Frames sent by a client must be masked.
+    header = bytes([0x80 | opcode])
+    if len(payload) < 126:
+        header += bytes([0x80 | len(payload)])
+    elif len(payload) < 65536:
+        header += bytes([0x80 | 126]) + struct.pack(">H", len(payload))
+    else:
+        header += bytes([0x80 | 127]) + struct.pack(">Q", len(payload))
+
+    mask = os.urandom(4)
+    size = len(payload)
+    masked = (
+        int.from_bytes(payload, "big")
+        ^ int.from_bytes((mask * (size // 4 + 1))[:size], "big")
+    ).to_bytes(size, "big")
+    return header + mask + masked
+
+
+def _field(number: int, value) -> bytes:
+    if isinstance(value, str):
+        return _bytes_field(number, value.encode())
+    if isinstance(value, bytes):
+        return _bytes_field(number, value)
+    if isinstance(value, list):
+        return b"".join(_varint_field(number, item) for item in value)
+    return _varint_field(number, int(value))
+
+
+def _varint_field(number: int, value: int) -> bytes:
+    return _varint(number << 3 | _VARINT) + _varint(value)
+
+
+def _bytes_field(number: int, value: bytes) -> bytes:
+    return (
+        _varint(number << 3 | _LENGTH_DELIMITED) + _varint(len(value)) + value
+    )
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def _decode(data: bytes) -> dict[int, list]:
+    """
+    Decodes the fields of a protobuf message, without knowing its type:
+    varints are returned as integers and length delimited fields as bytes.
+    Fixed size fields are skipped.
+    """
+    fields: dict[int, list] = {}
+    index = 0
+    while index < len(data):
+        key, index = _read_varint(data, index)
+        number, wire_type = key >> 3, key & 0x7
+        match wire_type:
+            case 0:
+                value, index = _read_varint(data, index)
+            case 1:
+                index += 8
+                continue
+            case 2:
+                size, index = _read_varint(data, index)
+                value = data[index : index + size]
+                index += size
+            case 5:
+                index += 4
+                continue
+            case _:
+                raise ValueError(f"Unsupported wire type {wire_type}.")
+        fields.setdefault(number, []).append(value)
+
+    if index != len(data):
+        raise ValueError("Truncated protobuf message.")
+
+    return fields
+
+
+def _read_varint(data: bytes, index: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        if index >= len(data):
+            raise ValueError("Truncated protobuf varint.")
+        byte = data[index]
+        index += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, index
+        shift += 7
+
+
+def _first(fields: dict[int, list], number: int, default=None):
+    values = fields.get(number)
+    return values[0] if values else default
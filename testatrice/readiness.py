@@ -0,0 +1,144 @@
+import asyncio
+import base64
+import os
+import socket
+import time
+from typing import Awaitable, Callable
+
+# The official client opens every TCP session with an empty CommandContainer,
+# which servatrice answers with its identification event.
+_TCP_GREETING: bytes = b"\x00\x00\x00\x00"
+
+_PROBE_INTERVAL: float = 0.05
+_PROBE_TIMEOUT: float = 1
+
+
+def probe_tcp(host: str, port: int, timeout: float = _PROBE_TIMEOUT) -> bool:
+    """
+    Returns True if servatrice accepts TCP connections on ``host:port``.
+
+    Podman may accept the connection on the host before anything listens in
+    the container, so the session is only considered open if the peer does
+    not hang up right after the greeting.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(_TCP_GREETING)
+            try:
+                return sock.recv(1) != b""
+            except socket.timeout:
+                return True
+    except OSError:
+        return False
+
+
+def probe_websocket(
+    host: str, port: int, timeout: float = _PROBE_TIMEOUT
+) -> bool:
+    """
+    Returns True if servatrice completes a WebSocket handshake on
+    ``host:port``.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(_websocket_handshake(host, port))
+            return sock.recv(1024).startswith(b"HTTP/1.1 101")
+    except OSError:
+        return False
+
+
+async def async_probe_tcp(
+    host: str, port: int, timeout: float = _PROBE_TIMEOUT
+) -> bool:
+    """
+    The asyncio version of ``probe_tcp``.
+    """
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    try:
+        writer.write(_TCP_GREETING)
+        await writer.drain()
+        return await asyncio.wait_for(reader.read(1), timeout) != b""
+    except asyncio.TimeoutError:
+        return True
+    except OSError:
+        return False
+    finally:
+        writer.close()
+
+
+async def async_probe_websocket(
+    host: str, port: int, timeout: float = _PROBE_TIMEOUT
+) -> bool:
+    """
+    The asyncio version of ``probe_websocket``.
+    """
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    try:
+        writer.write(_websocket_handshake(host, port))
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(1024), timeout)
+        return response.startswith(b"HTTP/1.1 101")
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
+
+
+def wait_until(
+    probe: Callable[[], bool],
+    timeout: float,
+    interval: float = _PROBE_INTERVAL,
+) -> bool:
+    """
+    Calls ``probe`` until it returns True or ``timeout`` seconds have passed.
+    Returns the last result of ``probe``.
+    """
+    deadline = time.monotonic() + timeout
+    while not probe():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+    return True
+
+
+async def async_wait_until(
+    probe: Callable[[], Awaitable[bool]],
+    timeout: float,
+    interval: float = _PROBE_INTERVAL,
+) -> bool:
+    """
+    The asyncio version of ``wait_until``.
+    """
+    deadline = time.monotonic() + timeout
+    while not await probe():
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(interval)
+
+    return True
+
+
+def _websocket_handshake(host: str, port: int) -> bytes:
+    key = base64.b64encode(os.urandom(16)).decode()
+    return (
+        "GET / HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n"
+        "\r\n"
+    ).encode()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import pathlib
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import jinja2
+
+INI_TEMPLATE: str = "testatrice.ini.j2"
+SQL_TEMPLATE: str = "testatrice.sql.j2"
+
+_TEMPLATES_PATH: pathlib.Path = pathlib.Path(__file__).parent / "templates"
+
+_templates: dict[str, jinja2.Template] = {}
+_digests: dict[str, str] = {}
+_templates_lock = threading.Lock()
+
+
+def load_source(path: str | os.PathLike = None, default: str = None) -> str:
+    """
+    Returns the source of the template at ``path``, or of the package
+    template named ``default`` if ``path`` is None.
+
+    Raises:
+        OSError: If the template file cannot be read.
+    """
+    if path is None:
+        return _package_source(default)
+
+    return pathlib.Path(path).read_text()
+
+
+def source_hash(source: str) -> str:
+    """
+    Returns the SHA-256 of a template source, which identifies the compiled
+    template in the process-wide cache.
+    """
+    digest = _digests.get(source)
+    if digest is None:
+        digest = hashlib.sha256(source.encode()).hexdigest()
+        _digests[source] = digest
+
+    return digest
+
+
+def render(source: str, variables: dict) -> str:
+    """
+    Renders the template ``source`` with ``variables``.
+
+    Templates are compiled once per process and cached by the digest of
+    their source, so rendering the same template for many servers only
+    runs the compiled template.
+
+    Raises:
+        jinja2.TemplateError: If the template is invalid.
+    """
+    return _compile(source).render(variables)
+
+
+def _compile(source: str) -> jinja2.Template:
+    digest = source_hash(source)
+    template = _templates.get(digest)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(digest)
+            if template is None:
+                template = _environment().from_string(source)
+                _templates[digest] = template
+
+    return template
+
+
+@functools.cache
+def _environment() -> jinja2.Environment:
+    # Imported on first use, as it is slow to import and not needed by most
+    # of the command line.
+    import jinja2
+
+    # The package templates were loaded with select_autoescape(), which does
+    # not escape .j2 files.
+    return jinja2.Environment(autoescape=False)
+
+
+@functools.cache
+def _package_source(name: str) -> str:
+    return (_TEMPLATES_PATH / name).read_text()
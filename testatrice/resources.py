@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+import threading
+import time
+from array import array
+from typing import NamedTuple
+
+from . import streams
+
+# The fields of a sample after the container name, in the order they are
+# stored in the ring buffers.
+_FIELDS: tuple[str, ...] = (
+    "timestamp",
+    "cpu_percent",
+    "memory_usage",
+    "memory_limit",
+    "network_input",
+    "network_output",
+    "block_input",
+    "block_output",
+    "pids",
+)
+
+# The libpod stats field of every sample field but the timestamp.
+_STATS_FIELDS: tuple[str, ...] = (
+    "CPU",
+    "MemUsage",
+    "MemLimit",
+    "NetInput",
+    "NetOutput",
+    "BlockInput",
+    "BlockOutput",
+    "PIDs",
+)
+
+# Prometheus metric, type and help of every sample field but the timestamp.
+_METRICS: tuple[tuple[str, str, str], ...] = (
+    (
+        "testatrice_container_cpu_percent",
+        "gauge",
+        "CPU usage over the last interval, in percent of one core.",
+    ),
+    (
+        "testatrice_container_memory_usage_bytes",
+        "gauge",
+        "Memory used by the container.",
+    ),
+    (
+        "testatrice_container_memory_limit_bytes",
+        "gauge",
+        "Memory limit of the container.",
+    ),
+    (
+        "testatrice_container_network_receive_bytes_total",
+        "counter",
+        "Bytes received by the container.",
+    ),
+    (
+        "testatrice_container_network_transmit_bytes_total",
+        "counter",
+        "Bytes sent by the container.",
+    ),
+    (
+        "testatrice_container_block_read_bytes_total",
+        "counter",
+        "Bytes read from block devices by the container.",
+    ),
+    (
+        "testatrice_container_block_write_bytes_total",
+        "counter",
+        "Bytes written to block devices by the container.",
+    ),
+    (
+        "testatrice_container_pids",
+        "gauge",
+        "Processes running in the container.",
+    ),
+)
+
+
+class ResourceSample(NamedTuple):
+    """
+    The resource usage of a container at one point in time.
+
+    Attributes:
+        container (str): The name of the container.
+        timestamp (float): When the sample was received, in seconds since the
+          epoch.
+        cpu_percent (float): The CPU usage over the last interval, in percent
+          of one core.
+        memory_usage (float): The memory used, in bytes.
+        memory_limit (float): The memory limit, in bytes.
+        network_input (float): The bytes received since the container
+          started.
+        network_output (float): The bytes sent since the container started.
+        block_input (float): The bytes read from block devices since the
+          container started.
+        block_output (float): The bytes written to block devices since the
+          container started.
+        pids (float): The number of processes.
+    """
+
+    container: str
+    timestamp: float
+    cpu_percent: float
+    memory_usage: float
+    memory_limit: float
+    network_input: float
+    network_output: float
+    block_input: float
+    block_output: float
+    pids: float
+
+
+class ResourceSampler:
+    """
+    Samples the CPU, memory, network I/O and block I/O of containers from
+    the podman stats stream, in a background thread.
+
+    The last ``capacity`` samples of every container are kept in a ring
+    buffer of doubles, so sampling for a whole test run uses a fixed amount
+    of memory. It can be used as a context manager, which starts sampling on
+    entry and stops on exit.
+
+    Arguments:
+        containers (list[str]): The names of the containers to sample.
+        interval (int): The number of seconds between samples, at least 1.
+        capacity (int): The number of samples kept per container.
+        client_arguments (dict): Keyword arguments passed to
+          ``podman.PodmanClient``, such as ``base_url``.
+
+    Raises:
+        ValueError: If ``interval`` or ``capacity`` is lower than 1.
+    """
+
+    def __init__(
+        self,
+        containers: list[str],
+        interval: int = 1,
+        capacity: int = 3600,
+        client_arguments: dict = None,
+    ):
+        if interval < 1 or capacity < 1:
+            raise ValueError(
+                f"The sampling interval ({interval}) and capacity ({capacity}) must be at least 1."
+            )
+
+        self.containers = list(containers)
+        self.interval = int(interval)
+        self.capacity = capacity
+        self.errors: int = 0
+        self.last_error: Exception | None = None
+        self._client_arguments = client_arguments or {}
+        self._buffers: dict[str, array] = {
+            container: array("d", bytes(8 * len(_FIELDS) * capacity))
+            for container in self.containers
+        }
+        self._counts: dict[str, int] = dict.fromkeys(self.containers, 0)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._response = None
+        self._thread: threading.Thread = None
+
+    def start(self) -> None:
+        """
+        Starts sampling, if not already started.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self.__sample, name="testatrice-resources", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops sampling. The samples are kept. If the sampling thread does
+        not stop within a few seconds, it is left to end on its own.
+        """
+        self._stopped.set()
+        response = self._response
+        if response is not None:
+            # Unblocks the thread waiting for the next sample, which closes
+            # the response itself.
+            streams.shutdown(response)
+        if self._thread is not None:
+            self._thread.join(streams.JOIN_TIMEOUT)
+            if not self._thread.is_alive():
+                self._thread = None
+
+    def samples(self, container: str = None) -> list[ResourceSample]:
+        """
+        Returns the samples kept for ``container``, or for all containers,
+        oldest first.
+        """
+        containers = self.containers if container is None else [container]
+        samples = []
+        with self._lock:
+            for name in containers:
+                buffer = self._buffers[name]
+                count = self._counts[name]
+                for index in range(max(0, count - self.capacity), count):
+                    start = index % self.capacity * len(_FIELDS)
+                    samples.append(
+                        ResourceSample(
+                            name, *buffer[start : start + len(_FIELDS)]
+                        )
+                    )
+
+        return samples
+
+    def latest(self) -> dict[str, ResourceSample]:
+        """
+        Returns the last sample of every container sampled at least once.
+        """
+        latest = {}
+        with self._lock:
+            for name in self.containers:
+                count = self._counts[name]
+                if count:
+                    start = (count - 1) % self.capacity * len(_FIELDS)
+                    latest[name] = ResourceSample(
+                        name,
+                        *self._buffers[name][start : start + len(_FIELDS)],
+                    )
+
+        return latest
+
+    def export_csv(self, path: str | os.PathLike) -> None:
+        """
+        Writes all the samples kept to ``path`` as CSV, with a header row.
+        """
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(ResourceSample._fields)
+            writer.writerows(self.samples())
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the last sample of every container in the Prometheus text
+        exposition format, with the time of the sample.
+        """
+        latest = self.latest().values()
+        lines = []
+        for field, (metric, metric_type, help_text) in zip(
+            _FIELDS[1:], _METRICS
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for sample in latest:
+                lines.append(
+                    f'{metric}{{container="{sample.container}"}} '
+                    f"{getattr(sample, field)!r} {int(sample.timestamp * 1000)}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path: str | os.PathLike) -> None:
+        """
+        Writes ``to_prometheus()`` to ``path``, for example for the textfile
+        collector of the node exporter.
+        """
+        with open(path, "w") as file:
+            file.write(self.to_prometheus())
+
+    def __enter__(self) -> ResourceSampler:
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def __sample(self):
+        import podman
+
+        # A stream holds its HTTP connection for as long as it runs, so the
+        # sampler has its own client instead of taking one from a session.
+        with podman.PodmanClient(**self._client_arguments) as podman_client:
+            while not self._stopped.is_set():
+                try:
+                    self._response = podman_client.api.get(
+                        "/containers/stats",
+                        params={
+                            "containers": self.containers,
+                            "stream": True,
+                            "interval": self.interval,
+                        },
+                        stream=True,
+                    )
+                    self._response.raise_for_status()
+                    for line in self._response.iter_lines():
+                        if line:
+                            self.__record(json.loads(line))
+                except Exception as exception:
+                    if self._stopped.is_set():
+                        break
+                    # A container restarting, such as during a reset, ends
+                    # the stream; it is opened again after an interval.
+                    self.errors += 1
+                    self.last_error = exception
+                finally:
+                    if self._response is not None:
+                        self._response.close()
+                        self._response = None
+
+                self._stopped.wait(self.interval)
+
+    def __record(self, report: dict):
+        timestamp = time.time()
+        with self._lock:
+            for stats in report.get("Stats") or ():
+                name = stats.get("Name")
+                if name not in self._buffers:
+                    continue
+
+                start = self._counts[name] % self.capacity * len(_FIELDS)
+                self._buffers[name][start : start + len(_FIELDS)] = array(
+                    "d",
+                    [timestamp]
+                    + [
+                        float(stats.get(field) or 0) for field in _STATS_FIELDS
+                    ],
+                )
+                self._counts[name] += 1
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import random
+import time
+from typing import Iterable, Iterator, NamedTuple
+
+# Every batch of generated rows is inserted without checking the foreign and
+# unique keys, which the generator guarantees, so InnoDB does not look up
+# every row in the referenced tables and secondary indexes.
+PREAMBLE: tuple[str, ...] = (
+    "SET SESSION foreign_key_checks=0",
+    "SET SESSION unique_checks=0",
+)
+
+# Seeded times are spread over the year 2024.
+_EPOCH: int = 1704067200
+_PERIOD: int = 366 * 24 * 3600
+
+# A user out of every _ADMIN_INTERVAL is an administrator, who issues bans.
+_ADMIN_INTERVAL: int = 1000
+
+_FIRST_NAMES: tuple[str, ...] = (
+    "Ada", "Alan", "Barbara", "Claude", "Donald", "Edsger", "Frances",
+    "Grace", "John", "Ken", "Leslie", "Margaret", "Niklaus", "Radia",
+    "Robin", "Tony",
+)  # fmt: skip
+_LAST_NAMES: tuple[str, ...] = (
+    "Allen", "Backus", "Dijkstra", "Hamilton", "Hoare", "Hopper", "Kay",
+    "Knuth", "Lamport", "Liskov", "Lovelace", "Milner", "Perlman", "Ritchie",
+    "Thompson", "Wirth",
+)  # fmt: skip
+_ROOMS: tuple[str, ...] = (
+    "General room",
+    "Registered room",
+    "Moderator room",
+    "Admin room",
+)
+_GAME_TYPES: tuple[str, ...] = ("GenGameType1", "GenGameType2", "")
+
+_USER_COLUMNS: str = (
+    "id,admin,name,realname,password_sha512,email,country,avatar_bmp,"
+    "registrationDate,active,clientid,adminnotes,privlevel,"
+    "privlevelStartDate,privlevelEndDate,passwordLastChangedDate"
+)
+_GAME_COLUMNS: str = (
+    "room_name,id,descr,creator_name,password,game_types,player_count,"
+    "time_started,time_finished"
+)
+_SESSION_COLUMNS: str = (
+    "user_name,id_server,ip_address,start_time,end_time,clientid,"
+    "connection_type"
+)
+_LOG_COLUMNS: str = (
+    "log_time,sender_id,sender_name,sender_ip,log_message,target_type,"
+    "target_id,target_name"
+)
+_BAN_COLUMNS: str = (
+    "user_name,ip_address,id_admin,time_from,minutes,reason,visible_reason,"
+    "clientid"
+)
+
+
+class SeedPlan(NamedTuple):
+    """
+    How many rows to generate in every table.
+
+    Attributes:
+        users (int): The number of users.
+        buddies (int): The number of buddies of every user.
+        ignores (int): The number of users every user ignores.
+        games (int): The number of games, created by random users.
+        players (int): The number of players of every game.
+        replays (float): The number of replays per game.
+        sessions (int): The number of past sessions of every user.
+        log (int): The number of chat messages logged per user.
+        bans (float): The fraction of the users who are banned.
+    """
+
+    users: int = 10000
+    buddies: int = 10
+    ignores: int = 2
+    games: int = 10000
+    players: int = 2
+    replays: float = 0.5
+    sessions: int = 5
+    log: int = 20
+    bans: float = 0.01
+
+
+def statements(
+    server_identifier: str,
+    plan: SeedPlan,
+    first_user_id: int,
+    first_game_id: int,
+    password_hash: str,
+    seed: int = 0,
+    rows_per_statement: int = 1000,
+    counts: dict[str, int] = None,
+) -> Iterator[str]:
+    """
+    Yields multi-row INSERT statements filling the tables of
+    ``server_identifier`` according to ``plan``. Rows are generated as the
+    statements are consumed, so memory use does not depend on the number
+    of rows, and the same ``seed`` always generates the same rows.
+
+    Users are inserted with the ids from ``first_user_id`` and named
+    ``user[id]``, all with ``password_hash``, and games with the ids from
+    ``first_game_id``, so the rows do not collide with existing ones. Every
+    foreign key references a seeded row; run the statements after
+    ``PREAMBLE`` to skip checking them. Games are created and played by
+    seeded users, so no games are seeded without users and a game has at
+    most every user as a player.
+
+    Arguments:
+        server_identifier: The prefix of the tables.
+        plan: The number of rows of every table.
+        first_user_id: The id of the first seeded user.
+        first_game_id: The id of the first seeded game.
+        password_hash: The ``password_sha512`` of every user.
+        seed: The seed of the generated values.
+        rows_per_statement: The number of rows of every INSERT.
+        counts: If passed, updated with the number of rows yielded per
+          table.
+    """
+    plan = plan._replace(
+        games=plan.games if plan.users > 0 else 0,
+        players=min(plan.players, plan.users),
+    )
+    users = _Users(first_user_id, plan.users)
+    tables = (
+        ("users", _USER_COLUMNS, _user_rows(users, password_hash)),
+        ("buddylist", "id_user1,id_user2", _pair_rows(users, plan.buddies)),
+        ("ignorelist", "id_user1,id_user2", _pair_rows(users, plan.ignores)),
+        ("games", _GAME_COLUMNS, _game_rows(users, plan, first_game_id)),
+        (
+            "games_players",
+            "id_game,player_name",
+            _player_rows(users, plan, first_game_id),
+        ),
+        (
+            "replays",
+            "id_game,duration,replay",
+            _replay_rows(plan, first_game_id),
+        ),
+        ("sessions", _SESSION_COLUMNS, _session_rows(users, plan.sessions)),
+        ("log", _LOG_COLUMNS, _log_rows(users, plan, first_game_id)),
+        ("bans", _BAN_COLUMNS, _ban_rows(users, plan.bans)),
+    )
+
+    for table, columns, rows in tables:
+        # Every table has its own generator, so changing the plan of one
+        # table does not change the rows of the others.
+        rows = rows(random.Random(f"{seed}:{table}"))
+        prefix = (
+            f"INSERT INTO `{server_identifier}_{table}` ({columns}) VALUES "
+        )
+        for batch in _batches(rows, rows_per_statement):
+            if counts is not None:
+                counts[table] = counts.get(table, 0) + len(batch)
+            yield prefix + ",".join(batch)
+
+
+class _Users:
+    def __init__(self, first_id: int, count: int):
+        self.first_id = first_id
+        self.count = count
+
+    def id(self, index: int) -> int:
+        return self.first_id + index
+
+    def name(self, index: int) -> str:
+        return f"user{self.first_id + index:07d}"
+
+    @staticmethod
+    def ip_address(index: int) -> str:
+        return f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+    @staticmethod
+    def client_id(index: int) -> str:
+        return f"c{index:014d}"[-15:]
+
+
+def _user_rows(users: _Users, password_hash: str):
+    def rows(generator: random.Random) -> Iterator[str]:
+        for index in range(users.count):
+            registered = _datetime(generator)
+            name = users.name(index)
+            yield (
+                f"({users.id(index)},{int(index % _ADMIN_INTERVAL == 0)},"
+                f"'{name}','{generator.choice(_FIRST_NAMES)} "
+                f"{generator.choice(_LAST_NAMES)}','{password_hash}',"
+                f"'{name}@example.com','{'USFRDEITJP'[index % 5 * 2:][:2]}',"
+                f"'','{registered}',1,'{users.client_id(index)}','','NONE',"
+                f"'{registered}','{registered}','{registered}')"
+            )
+
+    return rows
+
+
+def _pair_rows(users: _Users, per_user: int):
+    per_user = min(per_user, users.count - 1)
+
+    def rows(generator: random.Random) -> Iterator[str]:
+        if per_user < 1:
+            return
+        for index in range(users.count):
+            # Distinct offsets give distinct users other than this one.
+            for offset in generator.sample(range(1, users.count), per_user):
+                yield (
+                    f"({users.id(index)},"
+                    f"{users.id((index + offset) % users.count)})"
+                )
+
+    return rows
+
+
+def _game_rows(users: _Users, plan: SeedPlan, first_game_id: int):
+    def rows(generator: random.Random) -> Iterator[str]:
+        for index in range(plan.games):
+            started = _EPOCH + generator.randrange(_PERIOD)
+            yield (
+                f"('{generator.choice(_ROOMS)}',{first_game_id + index},"
+                f"'game {index}','"
+                f"{users.name(generator.randrange(users.count))}',"
+                f"{int(generator.random() < 0.1)},"
+                f"'{generator.choice(_GAME_TYPES)}',{plan.players},"
+                f"'{_format(started)}',"
+                f"'{_format(started + generator.randrange(60, 7200))}')"
+            )
+
+    return rows
+
+
+def _player_rows(users: _Users, plan: SeedPlan, first_game_id: int):
+    def rows(generator: random.Random) -> Iterator[str]:
+        if plan.players < 1:
+            return
+        for index in range(plan.games):
+            for player in generator.sample(range(users.count), plan.players):
+                yield f"({first_game_id + index},'{users.name(player)}')"
+
+    return rows
+
+
+def _replay_rows(plan: SeedPlan, first_game_id: int):
+    def rows(generator: random.Random) -> Iterator[str]:
+        for index in range(round(plan.games * plan.replays)):
+            yield (
+                f"({first_game_id + generator.randrange(plan.games)},"
+                f"{generator.randrange(60, 7200)},'')"
+            )
+
+    return rows
+
+
+def _session_rows(users: _Users, per_user: int):
+    def rows(generator: random.Random) -> Iterator[str]:
+        for index in range(users.count):
+            name = users.name(index)
+            ip_address = users.ip_address(index)
+            client_id = users.client_id(index)
+            for _ in range(per_user):
+                started = _EPOCH + generator.randrange(_PERIOD)
+                yield (
+                    f"('{name}',1,'{ip_address}','{_format(started)}',"
+                    f"'{_format(started + generator.randrange(60, 14400))}',"
+                    f"'{client_id}','"
+                    f"{'websocket' if generator.random() < 0.3 else 'tcp'}')"
+                )
+
+    return rows
+
+
+def _log_rows(users: _Users, plan: SeedPlan, first_game_id: int):
+    def rows(generator: random.Random) -> Iterator[str]:
+        for index in range(users.count):
+            prefix = (
+                f",{users.id(index)},'{users.name(index)}',"
+                f"'{users.ip_address(index)}','message from {index}',"
+            )
+            for _ in range(plan.log):
+                draw = generator.random()
+                if draw < 0.6:
+                    room = generator.randrange(len(_ROOMS))
+                    target = f"'room',{room + 1},'{_ROOMS[room]}'"
+                elif draw < 0.9 and plan.games:
+                    game = first_game_id + generator.randrange(plan.games)
+                    target = f"'game',{game},'game {game - first_game_id}'"
+                else:
+                    buddy = generator.randrange(users.count)
+                    target = f"'chat',{users.id(buddy)},'{users.name(buddy)}'"
+                yield f"('{_datetime(generator)}'{prefix}{target})"
+
+    return rows
+
+
+def _ban_rows(users: _Users, fraction: float):
+    admins = range(0, users.count, _ADMIN_INTERVAL)
+
+    def rows(generator: random.Random) -> Iterator[str]:
+        count = min(round(users.count * fraction), users.count)
+        if not count:
+            return
+        # Distinct users, since a user is banned once at a given time.
+        for index in generator.sample(range(users.count), count):
+            yield (
+                f"('{users.name(index)}','{users.ip_address(index)}',"
+                f"{users.id(generator.choice(admins))},"
+                f"'{_datetime(generator)}',{generator.choice((0, 60, 1440))},"
+                f"'seeded ban','seeded ban','{users.client_id(index)}')"
+            )
+
+    return rows
+
+
+def _batches(rows: Iterable[str], size: int) -> Iterator[list[str]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _datetime(generator: random.Random) -> str:
+    return _format(_EPOCH + generator.randrange(_PERIOD))
+
+
+def _format(timestamp: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(timestamp))
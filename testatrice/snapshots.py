@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import shutil
+import tarfile
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import archives
+
+if TYPE_CHECKING:
+    import podman
+
+_NAME_PATTERN: re.Pattern = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+_DUMP_DIRECTORY: str = "/tmp"
+
+# mariadb-dump writes the DROP and CREATE statements of every table, so
+# loading a dump replaces any older copy of the snapshot.
+_DUMP_SCRIPT: str = (
+    'out="$0"; mariadb-dump --skip-lock-tables --skip-add-locks '
+    '--extended-insert servatrice "$@" > "$out" && gzip -1 -f "$out"'
+)
+_LOAD_SCRIPT: str = (
+    'gunzip -c "$0" | mariadb servatrice; code=$?; rm -f "$0"; exit $code'
+)
+
+
+def validate_name(name: str) -> None:
+    """
+    Raises:
+        ValueError: If ``name`` cannot be used as a snapshot name, which
+          must be 1 to 128 letters, digits, dots, dashes or underscores.
+    """
+    if not _NAME_PATTERN.match(name):
+        raise ValueError(
+            f"Invalid snapshot name {name!r}: use 1 to 128 letters, digits, dots, dashes or underscores."
+        )
+
+
+def prefix(name: str) -> str:
+    """
+    Returns the prefix of the tables holding the snapshot ``name``. It only
+    depends on the name, so a snapshot taken from one server can be
+    restored to any other.
+    """
+    return f"snapshot{hashlib.sha256(name.encode()).hexdigest()[:16]}"
+
+
+def cache_path(name: str) -> Path:
+    """
+    Returns the path of the cached dump of the snapshot ``name`` on the
+    host, in ``$XDG_CACHE_HOME/testatrice/snapshots`` (``~/.cache`` by
+    default).
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "testatrice" / "snapshots" / f"{name}.sql.gz"
+
+
+def dump(
+    container: podman.domain.containers.Container,
+    tables: list[str],
+    destination: Path,
+) -> None:
+    """
+    Dumps ``tables`` of the ``servatrice`` database in ``container`` to the
+    gzip compressed SQL file ``destination`` on the host. The dump is
+    streamed to a temporary file first, so it is never held in memory and an
+    interrupted dump does not replace a complete one.
+
+    Raises:
+        RuntimeError: If the dump failed.
+    """
+    name = f"testatrice-{os.urandom(16).hex()}.sql"
+    path = f"{_DUMP_DIRECTORY}/{name}"
+    try:
+        exit_code, (_, error) = container.exec_run(
+            cmd=["sh", "-c", _DUMP_SCRIPT, path] + tables,
+            user="root",
+            demux=True,
+        )
+        if exit_code != 0:
+            raise RuntimeError(
+                f"Could not dump the snapshot tables: {(error or b'').decode(errors='replace').strip()}"
+            )
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        temporary = destination.with_name(f".{destination.name}.{os.getpid()}")
+        # get_archive reads the whole archive before returning it.
+        response = container.client.get(
+            f"/containers/{container.id}/archive",
+            params={"path": [f"{path}.gz"]},
+            stream=True,
+        )
+        try:
+            response.raise_for_status()
+            with (
+                tarfile.open(fileobj=response.raw, mode="r|") as tar,
+                temporary.open("wb") as file,
+            ):
+                shutil.copyfileobj(tar.extractfile(tar.next()), file)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+        finally:
+            response.close()
+    finally:
+        container.exec_run(cmd=["rm", "-f", path, f"{path}.gz"], user="root")
+
+    temporary.replace(destination)
+
+
+def load(container: podman.domain.containers.Container, source: Path) -> None:
+    """
+    Loads the gzip compressed SQL file ``source``, written by ``dump``, in
+    the ``servatrice`` database in ``container``.
+
+    Raises:
+        RuntimeError: If the dump could not be uploaded or loaded.
+    """
+    name = f"testatrice-{os.urandom(16).hex()}.sql.gz"
+    with archives.archive_path(name, source) as archive:
+        uploaded = container.put_archive(_DUMP_DIRECTORY, archive)
+    if not uploaded:
+        raise RuntimeError(f"Could not upload {source} to {container.name}.")
+
+    exit_code, (_, error) = container.exec_run(
+        cmd=["sh", "-c", _LOAD_SCRIPT, f"{_DUMP_DIRECTORY}/{name}"],
+        user="root",
+        demux=True,
+    )
+    if exit_code != 0:
+        raise RuntimeError(
+            f"Could not load {source}: {(error or b'').decode(errors='replace').strip()}"
+        )
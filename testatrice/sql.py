@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import bisect
+import io
+import os
+import re
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple
+
+from .archives import archive_file
+
+if TYPE_CHECKING:
+    import podman
+
+_SCRIPT_DIRECTORY: str = "/tmp"
+
+# The script is uploaded as a file and fed to mysql through a redirection, so
+# no SQL ever goes through shell quoting. The file is removed by the same
+# exec.
+_RUN_SCRIPT: str = 'mysql "$@" < "$0"; code=$?; rm -f "$0"; exit $code'
+
+_ERROR_PATTERN: re.Pattern = re.compile(
+    r"^ERROR (\d+) \(([0-9A-Z]+)\)(?: at line (\d+))?: (.*)$", re.MULTILINE
+)
+
+
+class SqlError(NamedTuple):
+    """
+    An error reported by the database for a single statement.
+
+    Attributes:
+        code (int): The MariaDB error code.
+        state (str): The SQLSTATE of the error.
+        message (str): The error message.
+        statement (str): The statement that caused the error, if known.
+    """
+
+    code: int
+    state: str
+    message: str
+    statement: str | None
+
+
+class SqlExecutionError(RuntimeError):
+    """
+    Raised when one or more SQL statements fail.
+
+    Attributes:
+        errors (list[SqlError]): The errors, in execution order.
+    """
+
+    def __init__(self, errors: list[SqlError]):
+        self.errors = errors
+        details = "\n".join(
+            f"ERROR {error.code} ({error.state}): {error.message}"
+            + (
+                f"\n  in: {_abbreviate(error.statement)}"
+                if error.statement is not None
+                else ""
+            )
+            for error in errors
+        )
+        super().__init__(f"{len(errors)} SQL statement(s) failed:\n{details}")
+
+
+def split_statements(sql: str) -> Iterator[str]:
+    """
+    Splits an SQL script into statements on the semicolons that are not
+    inside quotes, backticks or comments. Empty statements are skipped.
+    ``DELIMITER`` is not supported.
+    """
+    start = 0
+    index = 0
+    length = len(sql)
+    while index < length:
+        character = sql[index]
+        if character in "'\"`":
+            index += 1
+            while index < length and sql[index] != character:
+                if sql[index] == "\\" and character != "`":
+                    index += 1
+                index += 1
+        elif character == "-" and sql.startswith("-- ", index):
+            index = _end_of_line(sql, index)
+        elif character == "#":
+            index = _end_of_line(sql, index)
+        elif character == "/" and sql.startswith("/*", index):
+            end = sql.find("*/", index + 2)
+            index = length if end == -1 else end + 1
+        elif character == ";":
+            statement = sql[start:index].strip()
+            if statement:
+                yield statement
+            start = index + 1
+        index += 1
+
+    statement = sql[start:].strip()
+    if statement:
+        yield statement
+
+
+def execute(
+    container: podman.domain.containers.Container,
+    statements: str | Iterable[str],
+    database: str = None,
+    batch_size: int = 1000,
+    max_batch_bytes: int = 16 * 1024 * 1024,
+    preamble: Iterable[str] = (),
+) -> tuple[str, list[SqlError]]:
+    """
+    Runs SQL statements in ``container`` with the mysql client.
+
+    Statements are sent in batches of at most ``batch_size`` statements and
+    roughly ``max_batch_bytes`` bytes, one exec per batch. A batch does not
+    stop at the first failing statement; every error is collected with the
+    statement that caused it. ``statements`` can be a script or an iterable
+    of statements, which is consumed lazily, so large generated payloads use
+    bounded memory.
+
+    Arguments:
+        container: The database container.
+        statements: An SQL script or an iterable of single statements.
+        database: The default database for the statements, if any.
+        batch_size: The maximum number of statements per batch.
+        max_batch_bytes: The size after which a batch is sent even if it
+          holds fewer than ``batch_size`` statements.
+        preamble: Statements prepended to every batch, such as session
+          variables. Errors in the preamble are reported too.
+
+    Returns:
+        The standard output of mysql, in batch (tab separated) format, and the
+        list of errors.
+    """
+    if isinstance(statements, str):
+        statements = split_statements(statements)
+
+    preamble = list(preamble)
+    outputs = []
+    errors = []
+    batch = []
+    batch_bytes = 0
+
+    for statement in statements:
+        batch.append(statement)
+        batch_bytes += len(statement)
+        if len(batch) >= batch_size or batch_bytes >= max_batch_bytes:
+            output, batch_errors = _execute_batch(
+                container, preamble + batch, database
+            )
+            outputs.append(output)
+            errors += batch_errors
+            batch = []
+            batch_bytes = 0
+
+    if batch or not outputs:
+        output, batch_errors = _execute_batch(
+            container, preamble + batch, database
+        )
+        outputs.append(output)
+        errors += batch_errors
+
+    return "".join(outputs), errors
+
+
+def query(
+    container: podman.domain.containers.Container,
+    sql: str,
+    database: str = None,
+) -> list[list[str]]:
+    """
+    Runs a single query in ``container`` and returns its rows as lists of
+    strings, without the column names. ``NULL`` values are returned as the
+    string ``"NULL"``.
+
+    Raises:
+        SqlExecutionError: If the query fails.
+    """
+    command = ["mysql", "--batch", "--skip-column-names"]
+    if database is not None:
+        command.append(f"--database={database}")
+
+    exit_code, (output, error) = container.exec_run(
+        cmd=command + ["-e", sql],
+        user="root",
+        demux=True,
+    )
+    if exit_code != 0:
+        raise SqlExecutionError(
+            _parse_errors((error or b"").decode(errors="replace"), [sql])
+        )
+
+    return [
+        line.split("\t")
+        for line in (output or b"").decode().splitlines()
+        if line
+    ]
+
+
+def _execute_batch(
+    container: podman.domain.containers.Container,
+    statements: list[str],
+    database: str | None,
+) -> tuple[str, list[SqlError]]:
+    script = io.StringIO()
+    start_lines = []
+    line = 1
+    for statement in statements:
+        start_lines.append(line)
+        script.write(statement)
+        script.write(";\n")
+        line += statement.count("\n") + 1
+
+    name = f"testatrice-{os.urandom(16).hex()}.sql"
+    if not container.put_archive(
+        _SCRIPT_DIRECTORY, archive_file(name, script.getvalue())
+    ):
+        raise RuntimeError(
+            f"Could not upload the SQL script to {container.name}."
+        )
+
+    command = ["sh", "-c", _RUN_SCRIPT, f"{_SCRIPT_DIRECTORY}/{name}"]
+    command += ["--batch", "--force"]
+    if database is not None:
+        command.append(f"--database={database}")
+
+    exit_code, (output, error) = container.exec_run(
+        cmd=command, user="root", demux=True
+    )
+    output = (output or b"").decode(errors="replace")
+    error = (error or b"").decode(errors="replace")
+
+    errors = []
+    if exit_code != 0:
+        errors = _parse_errors(error, statements, start_lines)
+        if not errors:
+            errors = [SqlError(exit_code, "", error.strip(), None)]
+
+    return output, errors
+
+
+def _parse_errors(
+    error_output: str, statements: list[str], start_lines: list[int] = None
+) -> list[SqlError]:
+    errors = []
+    for match in _ERROR_PATTERN.finditer(error_output):
+        code, state, line, message = match.groups()
+        statement = None
+        if start_lines is None:
+            statement = statements[0]
+        elif line is not None:
+            index = bisect.bisect_right(start_lines, int(line)) - 1
+            if 0 <= index < len(statements):
+                statement = statements[index]
+        errors.append(SqlError(int(code), state, message, statement))
+
+    return errors
+
+
+def _end_of_line(sql: str, index: int) -> int:
+    end = sql.find("\n", index)
+    return len(sql) if end == -1 else end
+
+
+def _abbreviate(statement: str, length: int = 200) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) <= length:
+        return statement
+    return statement[: length - 3] + "..."
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import socket
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import podman
+
+# The number of seconds to wait for a thread reading a stream to notice that
+# the stream was shut down.
+JOIN_TIMEOUT: float = 5
+
+
+def shutdown(response: podman.api.client.APIResponse) -> None:
+    """
+    Shuts down the socket of the streamed ``response``, which wakes a thread
+    blocked reading it. Closing the response does not, and waits for that
+    thread instead.
+    """
+    connection = getattr(response.raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
@@ -1,17 +1,51 @@
-import errno
+from __future__ import annotations
+
+import hashlib
 import json
+import math
 import os
+import posixpath
+import random
+import re
 import shutil
 import socket
 import tempfile
+import threading
 import time
+import zlib
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
-from enum import Enum
-from typing import Iterator, Tuple
-
-import jinja2
-import podman
-from faker import Faker
+from enum import Enum, IntEnum
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Tuple,
+)
+
+from . import (
+    archives,
+    identifiers,
+    logfiles,
+    passwords,
+    ports,
+    rendering,
+    resources,
+    seeding,
+    snapshots,
+    sql,
+    streams,
+)
+
+# podman and its dependencies take longer to import than the rest of the
+# package, so they, like the other modules only needed once containers are
+# involved, are imported where they are used. This keeps the command line
+# fast for --help and argument errors.
+if TYPE_CHECKING:
+    import podman
 
 
 ## TODO: interface to get registration and password reset tokens
@@ -22,6 +56,20 @@ class TestServer:
     If a server identifier, TCP port or WebSocket port are not provided or are passed as None,
     they will be chosen randomly.
 
+    Every call opens its own podman connection unless a ``session`` is passed,
+    in which case its connection is used. A session can be shared by any
+    number of instances.
+
+    ``ini_template`` and ``sql_template`` are paths to custom Jinja2 templates
+    for the servatrice configuration and the database tables. They default to
+    the templates provided with the package. Templates are compiled once per
+    process and rendered outputs are cached per configuration.
+
+    When the environment runs several database shards, each server is
+    assigned to one of them by ``database_placement`` when it starts. Its
+    configuration and tables are rendered against that shard: templates get
+    its host name as ``database_hostname``.
+
     Attributes:
         server_identifier (str): The identifier for the server, used in the
           container name, as part of the servatrice instance name, and as the
@@ -32,11 +80,28 @@ class TestServer:
         ws_url (str): The full websocket URL to connect to the server, in the
           form ``ws://localhost:[port]``.
         log_path (str): The path on the local machine in which servatrice logs
-          are stored.
+          are stored. It is mounted on the directory of the ``logfile`` set
+          in the configuration.
+        readiness_probe (ReadinessProbe): How ``start`` detects that
+          servatrice is ready to accept clients.
+        readiness_timeout (float): The maximum number of seconds ``start``
+          waits for servatrice to be ready.
+        database_provisioning (DatabaseProvisioning): How ``start`` creates
+          the database tables of the server.
+        database_placement (DatabasePlacement): How ``start`` chooses the
+          database shard of the server.
+        database_container_name (str): The name of the database container
+          holding the tables of the server. Chosen by ``start``.
+        time_to_ready (float): The number of seconds between starting the
+          container and servatrice being ready, measured by the last call to
+          ``start``. None if the server was never started.
 
     Raises:
         ValueError: If either of ``tcp_port`` or ``websocket_port`` is already
           in use.
+        RuntimeError: If no port is available for ``tcp_port`` or
+          ``websocket_port``.
+        OSError: If ``ini_template`` or ``sql_template`` cannot be read.
     """
 
     _DOCKERFILES_PATH: str = f"{os.path.dirname(__file__)}/dockerfiles/"
@@ -46,11 +111,83 @@ class TestServer:
     _SERVER_DOCKERFILE_GITHUB: str = "testatrice-server-github.dockerfile"
     _SERVER_DOCKERFILE_LOCAL: str = "testatrice-server-local.dockerfile"
 
+    # The files in the dockerfiles directory that each image is built from,
+    # besides its dockerfile. The content hash of these inputs tags the image.
+    _IMAGE_INPUTS: dict[str, tuple[str, ...]] = {
+        _DATABASE_DOCKERFILE: (),
+        _MAILSERVER_DOCKERFILE: ("resources/mock_mailserver.py",),
+        _SERVER_DOCKERFILE_GITHUB: ("resources/server_entry_point.sh",),
+        _SERVER_DOCKERFILE_LOCAL: ("resources/server_entry_point.sh",),
+    }
+    _IMAGE_HASH_LENGTH: int = 12
+    _deb_hashes: dict[tuple[str, int, int], str] = {}
+
+    # Every container is labeled with its role, and server containers with
+    # their identifier, ports and the process that started them, so they
+    # can be found with server side filters.
+    _ROLE_LABEL: str = "testatrice.role"
+    _IDENTIFIER_LABEL: str = "testatrice.identifier"
+    _OWNER_LABEL: str = "testatrice.owner"
+    _TCP_PORT_LABEL: str = "testatrice.tcp-port"
+    _WEBSOCKET_PORT_LABEL: str = "testatrice.websocket-port"
+    _SERVER_ROLE: str = "server"
+    _DATABASE_ROLE: str = "database"
+    _MAILSERVER_ROLE: str = "mailserver"
+    _OWNER: str = f"{socket.gethostname()}:{os.getpid()}"
+
+    _DATABASE_PROFILE_LABEL: str = "testatrice.database-profile"
+    # Database containers are labeled with their shard index, and server
+    # containers with the name of the database container they use.
+    _DATABASE_SHARD_LABEL: str = "testatrice.database-shard"
+    _DATABASE_LABEL: str = "testatrice.database"
+
+    _STOP_TIMEOUT: int = 1
+
+    # Ports are reserved when an instance is created and released when it is
+    # stopped, so concurrent instances, in this process or others, never get
+    # the same port.
+    _port_allocator: ports.PortAllocator = ports.PortAllocator()
+    _MAX_STOP_WORKERS: int = 32
+
     _DATABASE_NAME: str = "testatrice-database"
     _MAILSERVER_NAME: str = "testatrice-mailserver"
     _BASE_SERVER_NAME: str = "testatrice-server"
     _NETWORK_NAME: str = "testatrice-network"
 
+    _LISTENING_LOG_PATTERN: re.Pattern = re.compile(
+        r"websocket server listening", re.IGNORECASE
+    )
+    # The log file set in the [server] section of the configuration.
+    _INI_LOG_FILE_PATTERN: re.Pattern = re.compile(
+        r"^\s*logfile\s*=\s*\"?(.*?)\"?\s*$", re.MULTILINE
+    )
+    _DATABASE_READY_LOG_PATTERN: re.Pattern = re.compile(
+        r"socket: '[^']*'\s+port: 3306"
+    )
+    _DATABASE_START_TIMEOUT: float = 120
+    # Seconds subtracted from the start time of the database when reading
+    # its logs, in case the clock of the podman service is behind.
+    _DATABASE_LOG_CLOCK_SKEW: int = 1
+
+    _DATABASE_DATA_PATH: str = "/var/lib/mysql"
+    # Arguments passed to mariadbd by the image entry point. Native AIO is
+    # not supported on tmpfs.
+    _EPHEMERAL_DATABASE_ARGUMENTS: tuple[str, ...] = (
+        "--innodb-flush-log-at-trx-commit=0",
+        "--innodb-doublewrite=0",
+        "--innodb-use-native-aio=0",
+        "--skip-log-bin",
+    )
+    # Servatrice keeps a database connection open per network thread plus
+    # one for the main thread. The margin leaves room for the mysql clients
+    # used to configure the database.
+    _DATABASE_CONNECTIONS_PER_SERVER: int = 4
+    _DATABASE_CONNECTIONS_MARGIN: int = 20
+    # Generated identifiers already used by a container or by tables, such
+    # as ones left over by an earlier process with the same id, are
+    # replaced up to this many times.
+    _IDENTIFIER_ATTEMPTS: int = 5
+
     class AuthenticationMethod(Enum):
         NONE = "none"
         PASSWORD = "password"
@@ -60,6 +197,90 @@ class TestServer:
         CONFIG = "config"
         SQL = "sql"
 
+    class ReadinessProbe(Enum):
+        TCP = "tcp"
+        WEBSOCKET = "websocket"
+        LOG = "log"
+
+    class DatabaseProvisioning(Enum):
+        """
+        ``RENDER`` runs the rendered SQL template for every server.
+
+        ``CLONE`` creates a template schema once per SQL template and copies
+        it for every server. Tables left behind by a previous server with
+        the same identifier are dropped.
+        """
+
+        RENDER = "render"
+        CLONE = "clone"
+
+    class DatabaseProfile(Enum):
+        """
+        How ``testatrice-database`` stores its data.
+
+        ``DEFAULT`` uses the stock MariaDB durability settings on the
+        container storage.
+
+        ``EPHEMERAL`` keeps the data directory on a tmpfs and trades
+        durability for throughput: the InnoDB log is not flushed at commit,
+        the doublewrite buffer is off and the buffer pool is sized
+        explicitly. All data is lost when the container stops.
+        """
+
+        DEFAULT = "default"
+        EPHEMERAL = "ephemeral"
+
+    class DatabasePlacement(Enum):
+        """
+        How a server is assigned to one of the database shards.
+
+        ``HASH`` picks the shard from a hash of the server identifier, so a
+        server always uses the same shard as long as the number of shards
+        does not change.
+
+        ``LEAST_LOADED`` picks the shard used by the fewest running servers.
+        Ties are broken randomly, so servers started at the same time are
+        spread across the shards.
+        """
+
+        HASH = "hash"
+        LEAST_LOADED = "least-loaded"
+
+    class IdentifierStyle(Enum):
+        """
+        How server identifiers are generated when none is passed. Both styles
+        are unique on the host and valid as SQL table prefixes.
+
+        ``COMPACT`` identifiers are made of the process start time, its id
+        and a counter, such as ``t0tn0v4800avu0``.
+
+        ``WORD`` identifiers are a random English word followed by the same
+        unique suffix. Faker is imported on first use.
+
+        A generated identifier already used by a container or by tables is
+        replaced by another one when the server starts.
+        """
+
+        COMPACT = "compact"
+        WORD = "word"
+
+        def __call__(self) -> str:
+            if self is TestServer.IdentifierStyle.WORD:
+                return identifiers.word()
+            return identifiers.compact()
+
+    class _SchemaTemplate(NamedTuple):
+        prefix: str
+        tables: list[str]
+        # (table, columns, referenced table, referenced columns, on update,
+        # on delete), tables without prefix
+        foreign_keys: list[tuple[str, str, str, str, str, str]]
+
+    _SCHEMA_TEMPLATES_TABLE: str = "testatrice_schema_templates"
+    _SNAPSHOTS_TABLE: str = "testatrice_snapshots"
+    _schema_templates: dict[tuple[str, str], _SchemaTemplate] = {}
+    _schema_templates_lock = threading.Lock()
+
     def __init__(
         self,
         *,
@@ -90,33 +311,60 @@ class TestServer:
         rooms_method: RoomMethod = RoomMethod.CONFIG,
         max_game_inactivity_time: int = 120,
         log_path: str = None,
+        readiness_probe: ReadinessProbe = ReadinessProbe.WEBSOCKET,
+        readiness_timeout: float = 30,
+        database_provisioning: DatabaseProvisioning = DatabaseProvisioning.RENDER,
+        database_placement: DatabasePlacement = DatabasePlacement.HASH,
+        ini_template: str | os.PathLike = None,
+        sql_template: str | os.PathLike = None,
+        session: "TestServer.Session" = None,
+        identifier_style: IdentifierStyle = IdentifierStyle.COMPACT,
     ):
         if server_identifier is None:
-            self.server_identifier: str = TestServer.__create_identifier()
+            self.server_identifier: str = identifier_style()
+            self._identifier_style = identifier_style
         else:
             self.server_identifier = server_identifier
+            self._identifier_style = None
 
         self.container_name = (
             TestServer._BASE_SERVER_NAME + "-" + self.server_identifier
         )
 
-        if tcp_port is None:
-            tcp_port = TestServer.__get_available_port()
-        elif TestServer.__is_port_used(tcp_port):
-            raise ValueError(f"Port {websocket_port} is already in use.")
-        self.tcp_port = tcp_port
+        self._ini_source = rendering.load_source(
+            ini_template, rendering.INI_TEMPLATE
+        )
+        self._sql_source = rendering.load_source(
+            sql_template, rendering.SQL_TEMPLATE
+        )
 
-        if websocket_port is None:
-            websocket_port = TestServer.__get_available_port()
-        elif TestServer.__is_port_used(websocket_port):
-            raise ValueError(f"Port {websocket_port} is already in use.")
-        self.websocket_port = websocket_port
+        self.tcp_port = TestServer.__reserve_port(tcp_port)
+        try:
+            self.websocket_port = TestServer.__reserve_port(websocket_port)
+        except (ValueError, RuntimeError):
+            TestServer._port_allocator.release(self.tcp_port)
+            raise
 
         self.log_path = log_path
+        self._log_file = f"/var/log/servatrice/{self.server_identifier}.log"
         self.ws_url = f"ws://localhost:{self.websocket_port}"
 
+        self.readiness_probe = readiness_probe
+        self.readiness_timeout = readiness_timeout
+        self.database_provisioning = database_provisioning
+        self.database_placement = database_placement
+        self.database_container_name: str = TestServer._DATABASE_NAME
+        self.time_to_ready: float = None
+        self._container_started_at: float = None
+        self._log_offset: int = 0
+        self._reset_statements: list[str] = None
+        self._session = session
+
         self._template_variables = {
             "server_identifier": self.server_identifier,
+            "database_hostname": TestServer.__database_hostname(
+                TestServer._DATABASE_NAME
+            ),
             "require_client_id": require_client_id,
             "required_features": required_features,
             "idle_client_timeout": idle_client_timeout,
@@ -153,44 +401,128 @@ class TestServer:
         Starts this testatrice-server instance and, if they are not already
           running, testatrice-database and testatrice-mailserver.
 
+        If servatrice does not get ready, the container is stopped and its
+        ports are released before the error is raised.
+
         Raises:
             ConnectionError: If the podman service is not available. Run
               ``podman system service -t 0 &`` to solve.
             RuntimeError: If a container using this same identifier already
               exists.
+            TimeoutError: If servatrice is not ready within
+              ``readiness_timeout`` seconds.
         """
 
-        with podman.PodmanClient() as podman_client:
-            if not podman_client.ping():
-                message = "The podman service did not respond."
-                TestServer.Logger.log(message)
-                raise ConnectionError(message)
+        with TestServer.__connection(self._session) as podman_client:
+            self._start(podman_client)
+            try:
+                self._wait_until_ready(podman_client)
+            except BaseException:
+                self._abort_start(podman_client)
+                raise
 
-            if podman_client.containers.exists(self.container_name):
-                message = f"A test server with identifier {self.server_identifier} already exists."
-                TestServer.Logger.log(message)
-                raise RuntimeError(message)
+    def _start(self, podman_client: podman.PodmanClient):
+        """
+        Configures the database and starts the container of this
+        testatrice-server instance using ``podman_client``, without waiting
+        for servatrice to start.
+        """
+        if self._identifier_style is not None:
+            self.__choose_identifier(podman_client)
 
+        if podman_client.containers.exists(self.container_name):
+            message = f"A test server with identifier {self.server_identifier} already exists."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise RuntimeError(message)
+
+        if self._session is not None:
+            environment_ok, message = self._session.verify_environment()
+        else:
             environment_ok, message = TestServer.verify_environment(
                 podman_client
             )
-            if not environment_ok:
-                TestServer.Logger.log(message)
-                raise RuntimeError(message)
+        if not environment_ok:
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise RuntimeError(message)
+
+        self.database_container_name = self.__place_database(podman_client)
+        self._template_variables["database_hostname"] = (
+            TestServer.__database_hostname(self.database_container_name)
+        )
+
+        rendered_ini = rendering.render(
+            self._ini_source, self._template_variables
+        )
+        # Custom templates may log elsewhere than the default path.
+        log_file = TestServer._INI_LOG_FILE_PATTERN.search(rendered_ini)
+        if log_file is not None and log_file.group(1):
+            self._log_file = log_file.group(1)
+
+        with TestServer.Logger.span(
+            "database.schema",
+            server=self.server_identifier,
+            database=self.database_container_name,
+            provisioning=self.database_provisioning.value,
+        ):
+            if (
+                self.database_provisioning
+                == TestServer.DatabaseProvisioning.CLONE
+            ):
+                self.__clone_database(podman_client)
+            else:
+                rendered_sql = rendering.render(
+                    self._sql_source, self._template_variables
+                )
+                self.__configure_database(podman_client, rendered_sql)
+                self._reset_statements = TestServer.__reset_statements(
+                    re.findall(
+                        r"CREATE TABLE(?: IF NOT EXISTS)? `?(\w+)`?",
+                        rendered_sql,
+                    ),
+                    re.findall(r"^\s*(INSERT\s.*?);\s*$", rendered_sql, re.M),
+                )
+
+        self.__start_server(podman_client, rendered_ini)
 
-            jinja_environment = jinja2.Environment(
-                loader=jinja2.PackageLoader("testatrice"),
-                autoescape=jinja2.select_autoescape(),
+    def __choose_identifier(self, podman_client: podman.PodmanClient):
+        """
+        Replaces the generated identifier of this testatrice-server instance
+        while a container or tables already use it.
+
+        Raises:
+            RuntimeError: If no unused identifier was generated in
+              ``_IDENTIFIER_ATTEMPTS`` attempts.
+        """
+        shards = TestServer.__database_shards(podman_client)
+        for _ in range(TestServer._IDENTIFIER_ATTEMPTS):
+            in_use = podman_client.containers.exists(
+                self.container_name
+            ) or any(
+                TestServer.__prefixed_tables(
+                    podman_client, shard, self.server_identifier
+                )
+                for shard in shards
             )
+            if not in_use:
+                return
 
-            ini_template = jinja_environment.get_template("testatrice.ini.j2")
-            sql_template = jinja_environment.get_template("testatrice.sql.j2")
+            TestServer.Logger.log(
+                f"Identifier {self.server_identifier} is already in use, generating another one.",
+                TestServer.Logger.Level.DEBUG,
+            )
+            self.__set_identifier(self._identifier_style())
 
-            rendered_ini = ini_template.render(self._template_variables)
-            rendered_sql = sql_template.render(self._template_variables)
+        message = f"Could not generate an unused server identifier in {TestServer._IDENTIFIER_ATTEMPTS} attempts."
+        TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+        raise RuntimeError(message)
 
-            self.__configure_database(podman_client, rendered_sql)
-            self.__start_server(podman_client, rendered_ini)
+    def __set_identifier(self, server_identifier: str):
+        self.server_identifier = server_identifier
+        self.container_name = (
+            TestServer._BASE_SERVER_NAME + "-" + server_identifier
+        )
+        self._log_file = f"/var/log/servatrice/{server_identifier}.log"
+        self._template_variables["server_identifier"] = server_identifier
 
     @staticmethod
     def verify_environment(
@@ -243,7 +575,11 @@ class TestServer:
         podman_client: podman.PodmanClient,
         recreate: bool = False,
         deb_path: str = None,
-    ):
+        database_profile: DatabaseProfile = DatabaseProfile.DEFAULT,
+        max_servers: int = 100,
+        database_buffer_pool_size: str = "512M",
+        database_shards: int = 1,
+    ) -> dict[str, float | None]:
         """
         Create the ``testatrice-network`` network if not already present,
         build the necessary images if not already present,
@@ -254,9 +590,16 @@ class TestServer:
         - ``testatrice-mailserver``
         - ``testatrice-server``
 
+        Every image is tagged with a hash of its dockerfile, the resources
+        it copies and the deb file, if any, and is only built when no image
+        with that tag exists. The ``latest`` tag is moved to the image
+        matching the current inputs. The images are built concurrently, each
+        from a build context holding only the files its dockerfile uses.
+
         Containers started:
 
         - ``testatrice-database``
+        - ``testatrice-database-[shard]`` for every shard after the first
         - ``testatrice-mailserver``
 
         ``testatrice-mailserver`` listens to port ``1110`` and ``1111`` to
@@ -266,38 +609,75 @@ class TestServer:
         Arguments:
             podman_client (podman.PodmanClient): An active podman.PodmanClient
               instance.
-            recreate (bool): Set to True if the images should be recreated
-              from scratch even if they already exist. The currently existing
-              images will be removed.
+            recreate (bool): Set to True if the images should be rebuilt from
+              scratch even if an image built from the same inputs already
+              exists.
             deb_path (str): Local path to the Cockatrice deb file to install
               on the server. If not present or set to None, the latest stable
               release is downloaded from GitHub.
-        """
+            database_profile (DatabaseProfile): How ``testatrice-database``
+              stores its data. Only applied when the container is created: a
+              running database keeps its profile until the environment is
+              destroyed.
+            max_servers (int): The number of servers expected to run at the
+              same time, used to size the database connection limit of each
+              shard.
+            database_buffer_pool_size (str): The InnoDB buffer pool size of
+              the ``EPHEMERAL`` profile, in MariaDB notation such as
+              ``512M``, for each shard.
+            database_shards (int): The number of database containers. They
+              are started concurrently and servers are spread across them
+              when they start. Shards that are already running are kept, so
+              the environment must be destroyed to remove shards.
+
+        Returns:
+            The number of seconds each image took to build, by image name, or
+            None for the images that were already present.
 
-        with tempfile.TemporaryDirectory() as temp_directory:
-            shutil.copytree(
-                TestServer._DOCKERFILES_PATH,
-                temp_directory,
-                dirs_exist_ok=True,
-            )
-            if deb_path is not None:
-                shutil.copy(
-                    deb_path, f"{temp_directory}/resources/cockatrice.deb"
-                )
+        Raises:
+            ValueError: If ``database_shards`` is lower than 1.
+            TimeoutError: If a database shard does not accept connections
+              after it is started.
+        """
+        if database_shards < 1:
+            message = f"At least one database shard is needed, not {database_shards}."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise ValueError(message)
+
+        TestServer.__create_network(podman_client)
+
+        # The images do not depend on each other, so they are built at the
+        # same time. The database and mailserver containers are started as
+        # soon as their own image is ready.
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(
+            max_workers=3, thread_name_prefix="testatrice-build"
+        ) as executor:
+            futures = {
+                TestServer._DATABASE_NAME: executor.submit(
+                    TestServer.__start_databases,
+                    podman_client,
+                    recreate=recreate,
+                    shards=database_shards,
+                    profile=database_profile,
+                    max_servers=max_servers,
+                    buffer_pool_size=database_buffer_pool_size,
+                ),
+                TestServer._MAILSERVER_NAME: executor.submit(
+                    TestServer.__start_mailserver,
+                    podman_client,
+                    recreate=recreate,
+                ),
+                TestServer._BASE_SERVER_NAME: executor.submit(
+                    TestServer.__build_base_server,
+                    podman_client,
+                    deb_path=deb_path,
+                    recreate=recreate,
+                ),
+            }
 
-            TestServer.__create_network(podman_client)
-            TestServer.__start_database(
-                podman_client, context=temp_directory, recreate=recreate
-            )
-            TestServer.__start_mailserver(
-                podman_client, context=temp_directory, recreate=recreate
-            )
-            TestServer.__build_base_server(
-                podman_client,
-                context=temp_directory,
-                deb_path=deb_path,
-                recreate=recreate,
-            )
+        return {name: future.result() for name, future in futures.items()}
 
     @staticmethod
     def __create_network(podman_client: podman.PodmanClient):
@@ -312,98 +692,203 @@ class TestServer:
             )
 
     @staticmethod
-    def __start_database(
+    def __start_databases(
         podman_client: podman.PodmanClient,
-        context: str,
         recreate: bool = False,
-    ):
-        if recreate and podman_client.images.exists(TestServer._DATABASE_NAME):
-            TestServer.Logger.log(
-                f"Removing {TestServer._DATABASE_NAME} image..."
-            )
-            podman_client.images.remove(TestServer._DATABASE_NAME)
+        shards: int = 1,
+        profile: DatabaseProfile = DatabaseProfile.DEFAULT,
+        max_servers: int = 100,
+        buffer_pool_size: str = "512M",
+    ) -> float | None:
+        build_time = TestServer.__build_image(
+            podman_client,
+            TestServer._DATABASE_NAME,
+            TestServer._DATABASE_DOCKERFILE,
+            recreate=recreate,
+        )
 
-        if not podman_client.images.exists(TestServer._DATABASE_NAME):
-            TestServer.Logger.log(
-                f"Creating {TestServer._DATABASE_NAME} image..."
-            )
-            result = podman_client.images.build(
-                path=context,
-                dockerfile=TestServer._DATABASE_DOCKERFILE,
-                tag=TestServer._DATABASE_NAME,
-                nocache=recreate,
-            )
+        max_connections = (
+            math.ceil(max_servers / shards)
+            * TestServer._DATABASE_CONNECTIONS_PER_SERVER
+            + TestServer._DATABASE_CONNECTIONS_MARGIN
+        )
 
-            TestServer.Logger.log(result[1])
-        else:
-            TestServer.Logger.log(
-                f"Image {TestServer._DATABASE_NAME} already exists. Skipping build step."
-            )
+        # Each shard waits for its own entry point to initialize the
+        # database, so they are started at the same time.
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(
+            max_workers=shards, thread_name_prefix="testatrice-database"
+        ) as executor:
+            for future in [
+                executor.submit(
+                    TestServer.__start_database,
+                    podman_client,
+                    shard,
+                    profile=profile,
+                    max_connections=max_connections,
+                    buffer_pool_size=buffer_pool_size,
+                )
+                for shard in range(shards)
+            ]:
+                future.result()
 
-        if not podman_client.containers.exists(TestServer._DATABASE_NAME):
-            TestServer.Logger.log(
-                f"Creating {TestServer._DATABASE_NAME} container..."
-            )
-            podman_client.containers.create(
-                image=TestServer._DATABASE_NAME,
-                auto_remove=True,
-                detach=True,
-                hostname=TestServer._DATABASE_NAME,
-                name=TestServer._DATABASE_NAME,
-                network=TestServer._NETWORK_NAME,
-                network_mode="bridge",
-            )
+        return build_time
+
+    @staticmethod
+    def __start_database(
+        podman_client: podman.PodmanClient,
+        shard: int,
+        profile: DatabaseProfile,
+        max_connections: int,
+        buffer_pool_size: str,
+    ):
+        name = TestServer.__database_shard_name(shard)
+
+        if not podman_client.containers.exists(name):
+            TestServer.Logger.log(f"Creating {name} container...")
+            command = [f"--max-connections={max_connections}"]
+            mounts = []
+            if profile == TestServer.DatabaseProfile.EPHEMERAL:
+                command += TestServer._EPHEMERAL_DATABASE_ARGUMENTS
+                command.append(f"--innodb-buffer-pool-size={buffer_pool_size}")
+                mounts.append(
+                    {
+                        "type": "tmpfs",
+                        "source": "tmpfs",
+                        "target": TestServer._DATABASE_DATA_PATH,
+                    }
+                )
+
+            with TestServer.Logger.span("database.create", database=name):
+                podman_client.containers.create(
+                    image=TestServer._DATABASE_NAME,
+                    command=command,
+                    auto_remove=True,
+                    detach=True,
+                    hostname=name,
+                    name=name,
+                    network=TestServer._NETWORK_NAME,
+                    network_mode="bridge",
+                    mounts=mounts,
+                    labels={
+                        TestServer._ROLE_LABEL: TestServer._DATABASE_ROLE,
+                        TestServer._DATABASE_PROFILE_LABEL: profile.value,
+                        TestServer._DATABASE_SHARD_LABEL: str(shard),
+                    },
+                )
         else:
             TestServer.Logger.log(
-                f"Container {TestServer._DATABASE_NAME} already exists. Skipping creation step."
+                f"Container {name} already exists. Skipping creation step."
             )
+            existing_labels = podman_client.containers.get(name).labels or {}
+            existing_profile = existing_labels.get(
+                TestServer._DATABASE_PROFILE_LABEL,
+                TestServer.DatabaseProfile.DEFAULT.value,
+            )
+            if existing_profile != profile.value:
+                TestServer.Logger.log(
+                    f"Container {name} uses the {existing_profile} profile, not {profile.value}. Destroy the environment to change it.",
+                    TestServer.Logger.Level.WARNING,
+                )
 
-        database_container = podman_client.containers.get(
-            TestServer._DATABASE_NAME
-        )
+        database_container = podman_client.containers.get(name)
 
         if database_container.status != "running":
-            TestServer.Logger.log(
-                f"Running {TestServer._DATABASE_NAME} container..."
-            )
-            database_container.start()
-            TestServer.__wait_until_database_is_up(podman_client)
+            TestServer.Logger.log(f"Running {name} container...")
+            # podman reads naive datetimes as UTC, so the start time is
+            # passed as an epoch timestamp.
+            started_at = int(time.time()) - TestServer._DATABASE_LOG_CLOCK_SKEW
+            with TestServer.Logger.span("database.start", database=name):
+                database_container.start()
+                TestServer.__wait_until_database_is_up(
+                    podman_client, name, since=started_at
+                )
         else:
             TestServer.Logger.log(
-                f"Container {TestServer._DATABASE_NAME} is already running. Skipping run step."
+                f"Container {name} is already running. Skipping run step."
             )
 
     @staticmethod
-    def __start_mailserver(
-        podman_client: podman.PodmanClient,
-        context: str,
-        recreate: bool = False,
-    ):
-        if recreate and podman_client.images.exists(
-            TestServer._MAILSERVER_NAME
-        ):
-            TestServer.Logger.log(
-                f"Removing {TestServer._MAILSERVER_NAME} image..."
-            )
-            podman_client.images.remove(TestServer._MAILSERVER_NAME)
+    def __database_shard_name(shard: int) -> str:
+        # The first shard keeps the name of the single database, so
+        # environments and templates from before sharding keep working.
+        if shard == 0:
+            return TestServer._DATABASE_NAME
+        return f"{TestServer._DATABASE_NAME}-{shard}"
 
-        if not podman_client.images.exists(TestServer._MAILSERVER_NAME):
-            TestServer.Logger.log(
-                f"Creating {TestServer._MAILSERVER_NAME} image..."
-            )
+    @staticmethod
+    def __database_hostname(database_container_name: str) -> str:
+        return f"{database_container_name}.dns.podman"
 
-            result = podman_client.images.build(
-                path=context,
-                dockerfile=TestServer._MAILSERVER_DOCKERFILE,
-                tag=TestServer._MAILSERVER_NAME,
-                nocache=recreate,
+    @staticmethod
+    def __database_shards(podman_client: podman.PodmanClient) -> list[str]:
+        database_containers = podman_client.containers.list(
+            filters={
+                "label": [
+                    f"{TestServer._ROLE_LABEL}={TestServer._DATABASE_ROLE}"
+                ],
+                "status": "running",
+            }
+        )
+        # Databases created before sharding have no shard label and are the
+        # first shard.
+        shards = sorted(
+            (
+                int(
+                    (container.labels or {}).get(
+                        TestServer._DATABASE_SHARD_LABEL, 0
+                    )
+                ),
+                container.name,
             )
+            for container in database_containers
+        )
 
-            TestServer.Logger.log(result[1])
-        else:
-            TestServer.Logger.log(
-                f"Image {TestServer._MAILSERVER_NAME} already exists. Skipping build step."
-            )
+        return [name for _, name in shards] or [TestServer._DATABASE_NAME]
+
+    def __place_database(self, podman_client: podman.PodmanClient) -> str:
+        shards = TestServer.__database_shards(podman_client)
+        if len(shards) == 1:
+            return shards[0]
+
+        match self.database_placement:
+            case TestServer.DatabasePlacement.HASH:
+                return shards[
+                    zlib.crc32(self.server_identifier.encode()) % len(shards)
+                ]
+            case TestServer.DatabasePlacement.LEAST_LOADED:
+                loads = dict.fromkeys(shards, 0)
+                for server_container in podman_client.containers.list(
+                    filters={
+                        "label": [
+                            f"{TestServer._ROLE_LABEL}={TestServer._SERVER_ROLE}"
+                        ],
+                        "status": "running",
+                    }
+                ):
+                    database = (server_container.labels or {}).get(
+                        TestServer._DATABASE_LABEL, TestServer._DATABASE_NAME
+                    )
+                    if database in loads:
+                        loads[database] += 1
+
+                lowest = min(loads.values())
+                return random.choice(
+                    [name for name, load in loads.items() if load == lowest]
+                )
+
+    @staticmethod
+    def __start_mailserver(
+        podman_client: podman.PodmanClient,
+        recreate: bool = False,
+    ) -> float | None:
+        build_time = TestServer.__build_image(
+            podman_client,
+            TestServer._MAILSERVER_NAME,
+            TestServer._MAILSERVER_DOCKERFILE,
+            recreate=recreate,
+        )
 
         if not podman_client.containers.exists(TestServer._MAILSERVER_NAME):
             TestServer.Logger.log(
@@ -418,6 +903,7 @@ class TestServer:
                 network=TestServer._NETWORK_NAME,
                 network_mode="bridge",
                 ports={"1110/tcp": 1110, "1111/tcp": 1111},
+                labels={TestServer._ROLE_LABEL: TestServer._MAILSERVER_ROLE},
             )
         else:
             TestServer.Logger.log(
@@ -437,92 +923,375 @@ class TestServer:
                 f"Container {TestServer._MAILSERVER_NAME} is already running. Skipping run step."
             )
 
+        return build_time
+
     @staticmethod
     def __build_base_server(
         podman_client: podman.PodmanClient,
-        context: str,
         deb_path: str = None,
         recreate: bool = False,
-    ):
-        if recreate and podman_client.images.exists(
-            TestServer._BASE_SERVER_NAME
-        ):
+    ) -> float | None:
+        if deb_path is None:
+            dockerfile = TestServer._SERVER_DOCKERFILE_GITHUB
+        else:
+            dockerfile = TestServer._SERVER_DOCKERFILE_LOCAL
+
+        return TestServer.__build_image(
+            podman_client,
+            TestServer._BASE_SERVER_NAME,
+            dockerfile,
+            deb_path=deb_path,
+            recreate=recreate,
+        )
+
+    @staticmethod
+    def __build_image(
+        podman_client: podman.PodmanClient,
+        name: str,
+        dockerfile: str,
+        deb_path: str = None,
+        recreate: bool = False,
+    ) -> float | None:
+        # Images are tagged with the hash of their inputs, so an image is only
+        # built when its inputs changed, and images built from different
+        # inputs coexist. The latest tag, used to create containers, is moved
+        # to the image matching the current inputs.
+        image_hash = TestServer.__image_hash(dockerfile, deb_path)
+        hashed_name = f"{name}:{image_hash}"
+
+        build_time = None
+        if recreate or not podman_client.images.exists(hashed_name):
+            TestServer.Logger.log(f"Creating {hashed_name} image...")
+            with tempfile.TemporaryDirectory() as context:
+                TestServer.__prepare_build_context(
+                    context, dockerfile, deb_path
+                )
+                build_started_at = time.perf_counter()
+                with TestServer.Logger.span("image.build", image=hashed_name):
+                    result = podman_client.images.build(
+                        path=context,
+                        dockerfile=dockerfile,
+                        tag=hashed_name,
+                        nocache=recreate,
+                    )
+                build_time = time.perf_counter() - build_started_at
+
+            TestServer.Logger.log(result[1])
             TestServer.Logger.log(
-                f"Removing {TestServer._BASE_SERVER_NAME} image..."
+                f"Image {hashed_name} built in {build_time:.1f} seconds."
             )
-            podman_client.images.remove(TestServer._BASE_SERVER_NAME)
-
-        if not podman_client.images.exists(TestServer._BASE_SERVER_NAME):
+        else:
             TestServer.Logger.log(
-                f"Creating {TestServer._BASE_SERVER_NAME} image..."
+                f"Image {hashed_name} already exists. Skipping build step."
             )
 
-            if deb_path is None:
-                dockerfile = TestServer._SERVER_DOCKERFILE_GITHUB
-            else:
-                dockerfile = TestServer._SERVER_DOCKERFILE_LOCAL
+        podman_client.images.get(hashed_name).tag(name, "latest")
+        return build_time
 
-            result = podman_client.images.build(
-                path=context,
-                dockerfile=dockerfile,
-                tag=TestServer._BASE_SERVER_NAME,
-                nocache=recreate,
+    @staticmethod
+    def __prepare_build_context(
+        context: str, dockerfile: str, deb_path: str = None
+    ):
+        # Only the files used by the dockerfile are sent to podman.
+        for input_path in (dockerfile, *TestServer._IMAGE_INPUTS[dockerfile]):
+            os.makedirs(
+                os.path.dirname(f"{context}/{input_path}"), exist_ok=True
             )
-
-            TestServer.Logger.log(result[1])
-        else:
-            TestServer.Logger.log(
-                f"Image {TestServer._BASE_SERVER_NAME} already exists. Skipping build step."
+            shutil.copy(
+                TestServer._DOCKERFILES_PATH + input_path,
+                f"{context}/{input_path}",
             )
 
+        if deb_path is not None:
+            os.makedirs(f"{context}/resources", exist_ok=True)
+            # A hard link avoids copying the deb when the temporary directory
+            # is on the same file system.
+            try:
+                os.link(deb_path, f"{context}/resources/cockatrice.deb")
+            except OSError:
+                shutil.copy(deb_path, f"{context}/resources/cockatrice.deb")
+
+    @staticmethod
+    def __image_hash(dockerfile: str, deb_path: str = None) -> str:
+        image_hash = hashlib.sha256()
+        for input_path in (dockerfile, *TestServer._IMAGE_INPUTS[dockerfile]):
+            with open(TestServer._DOCKERFILES_PATH + input_path, "rb") as file:
+                content = file.read()
+            image_hash.update(f"{input_path}\0{len(content)}\0".encode())
+            image_hash.update(content)
+
+        if deb_path is not None:
+            image_hash.update(b"cockatrice.deb\0")
+            image_hash.update(TestServer.__deb_hash(deb_path).encode())
+
+        return image_hash.hexdigest()[: TestServer._IMAGE_HASH_LENGTH]
+
+    @staticmethod
+    def __deb_hash(deb_path: str) -> str:
+        # Hashing a deb of several hundred megabytes takes a while, so the
+        # result is kept for as long as the file is not modified.
+        status = os.stat(deb_path)
+        key = (os.path.realpath(deb_path), status.st_size, status.st_mtime_ns)
+        if key not in TestServer._deb_hashes:
+            deb_hash = hashlib.sha256()
+            with open(deb_path, "rb") as file:
+                while chunk := file.read(1024 * 1024):
+                    deb_hash.update(chunk)
+            TestServer._deb_hashes[key] = deb_hash.hexdigest()
+
+        return TestServer._deb_hashes[key]
+
     @staticmethod
-    def __wait_until_database_is_up(podman_client: podman.PodmanClient):
+    def __wait_until_database_is_up(
+        podman_client: podman.PodmanClient,
+        database_container_name: str,
+        since: int,
+    ):
         database_container = podman_client.containers.get(
-            TestServer._DATABASE_NAME
+            database_container_name
         )
 
-        TestServer.Logger.log("Waiting for the temporary database to sart...")
-        exit_code, _ = database_container.exec_run("mysql")
-        while exit_code != 0:
-            time.sleep(0.2)
-            exit_code, _ = database_container.exec_run("mysql")
-
-        # TODO: I hoped to be able to do everything in a non-hacky way.
-        # The database starts, then it restarts. It's not fully operational
-        # as soon as the socket is available. Maybe there is a better way to
-        # go about this, but for now this will do.
-
-        TestServer.Logger.log("Waiting for the temporary database to stop...")
-        max_attempts = 300
-        attempt = 0
-        exit_code, _ = database_container.exec_run("mysql")
-        while exit_code == 0 and attempt < max_attempts:
-            attempt += 1
-            time.sleep(0.2)
-            exit_code, _ = database_container.exec_run("mysql")
+        # The entry point runs a temporary server without networking to
+        # initialize the database, then restarts it. Only the real server
+        # reports a TCP port when it is ready for connections, so following
+        # the container logs avoids polling the database with exec calls.
+        TestServer.Logger.log(
+            f"Waiting for {database_container_name} to start..."
+        )
+        # The response is requested directly rather than with logs(), which
+        # only returns the frames, so that it can be closed on timeout.
+        response = podman_client.api.get(
+            f"/containers/{database_container.id}/logs",
+            params={
+                "follow": True,
+                "stdout": True,
+                "stderr": True,
+                "since": since,
+            },
+            stream=True,
+        )
+        response.raise_for_status()
+        ready = TestServer._wait_for_pattern(
+            response,
+            TestServer._DATABASE_READY_LOG_PATTERN,
+            TestServer._DATABASE_START_TIMEOUT,
+        )
 
-        TestServer.Logger.log("Waiting for the real database to start...")
-        exit_code, _ = database_container.exec_run("mysql")
-        while exit_code != 0:
-            time.sleep(0.2)
-            exit_code, _ = database_container.exec_run("mysql")
+        if not ready:
+            message = f"Container {database_container_name} did not accept connections after {TestServer._DATABASE_START_TIMEOUT} seconds."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise TimeoutError(message)
 
-    @staticmethod
     def __configure_database(
-        podman_client: podman.PodmanClient, rendered_sql: str
+        self, podman_client: podman.PodmanClient, rendered_sql: str
     ):
         database_container = podman_client.containers.get(
-            TestServer._DATABASE_NAME
+            self.database_container_name
+        )
+
+        TestServer.Logger.log(
+            f"Building database in {self.database_container_name}..."
+        )
+        _, errors = sql.execute(database_container, rendered_sql)
+        if errors:
+            error = sql.SqlExecutionError(errors)
+            TestServer.Logger.log(str(error), TestServer.Logger.Level.ERROR)
+            raise error
+
+    def __clone_database(self, podman_client: podman.PodmanClient):
+        schema_template = self.__get_schema_template(podman_client)
+        prefix = self.server_identifier
+
+        statements = ["USE `servatrice`", "SET FOREIGN_KEY_CHECKS = 0"]
+        for table in schema_template.tables:
+            statements.append(f"DROP TABLE IF EXISTS `{prefix}_{table}`")
+            statements.append(
+                f"CREATE TABLE `{prefix}_{table}` LIKE `{schema_template.prefix}_{table}`"
+            )
+        # CREATE TABLE ... LIKE does not copy foreign keys.
+        foreign_keys: dict[str, list[str]] = {}
+        for (
+            table,
+            columns,
+            referenced_table,
+            referenced_columns,
+            on_update,
+            on_delete,
+        ) in schema_template.foreign_keys:
+            foreign_keys.setdefault(table, []).append(
+                f"ADD FOREIGN KEY ({columns}) "
+                f"REFERENCES `{prefix}_{referenced_table}` ({referenced_columns}) "
+                f"ON DELETE {on_delete} ON UPDATE {on_update}"
+            )
+        for table, clauses in foreign_keys.items():
+            statements.append(
+                f"ALTER TABLE `{prefix}_{table}` " + ", ".join(clauses)
+            )
+        baseline = [
+            f"INSERT INTO `{prefix}_{table}` SELECT * FROM `{schema_template.prefix}_{table}`"
+            for table in schema_template.tables
+        ]
+        statements += baseline
+        statements.append("SET FOREIGN_KEY_CHECKS = 1")
+        self._reset_statements = TestServer.__reset_statements(
+            [f"{prefix}_{table}" for table in schema_template.tables],
+            baseline,
+        )
+
+        TestServer.Logger.log(
+            f"Cloning database template {schema_template.prefix}..."
+        )
+        TestServer.__run_sql(
+            podman_client, self.database_container_name, statements
+        )
+
+    @staticmethod
+    def __reset_statements(
+        tables: list[str], baseline: list[str]
+    ) -> list[str]:
+        return (
+            ["USE `servatrice`", "SET FOREIGN_KEY_CHECKS = 0"]
+            + [f"TRUNCATE TABLE `{table}`" for table in tables]
+            + baseline
+            + ["SET FOREIGN_KEY_CHECKS = 1"]
+        )
+
+    def __get_schema_template(
+        self, podman_client: podman.PodmanClient
+    ) -> _SchemaTemplate:
+        database_id = podman_client.containers.get(
+            self.database_container_name
+        ).id
+        source_hash = rendering.source_hash(self._sql_source)
+        key = (database_id, source_hash)
+
+        with TestServer._schema_templates_lock:
+            if key not in TestServer._schema_templates:
+                prefix = f"template{source_hash[:16]}"
+                schema_template = TestServer.__load_schema_template(
+                    podman_client, self.database_container_name, prefix
+                )
+
+                if schema_template is None:
+                    TestServer.Logger.log(
+                        f"Creating database template {prefix}..."
+                    )
+                    variables = dict(
+                        self._template_variables, server_identifier=prefix
+                    )
+                    # Templates are only recorded once their script ran
+                    # successfully, so a partially created one is replayed.
+                    TestServer.__run_sql(
+                        podman_client,
+                        self.database_container_name,
+                        rendering.render(self._sql_source, variables) + f"""
+CREATE TABLE IF NOT EXISTS `servatrice`.`{TestServer._SCHEMA_TEMPLATES_TABLE}` (
+  `prefix` varchar(64) NOT NULL,
+  PRIMARY KEY (`prefix`)
+);
+INSERT IGNORE INTO `servatrice`.`{TestServer._SCHEMA_TEMPLATES_TABLE}` VALUES ('{prefix}');
+""",
+                    )
+                    schema_template = TestServer.__load_schema_template(
+                        podman_client, self.database_container_name, prefix
+                    )
+
+                TestServer._schema_templates[key] = schema_template
+
+            return TestServer._schema_templates[key]
+
+    @staticmethod
+    def __load_schema_template(
+        podman_client: podman.PodmanClient,
+        database_container_name: str,
+        prefix: str,
+    ) -> _SchemaTemplate | None:
+        if not TestServer.__query_sql(
+            podman_client,
+            database_container_name,
+            "SELECT 1 FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = 'servatrice' "
+            f"AND TABLE_NAME = '{TestServer._SCHEMA_TEMPLATES_TABLE}'",
+        ) or not TestServer.__query_sql(
+            podman_client,
+            database_container_name,
+            f"SELECT 1 FROM `servatrice`.`{TestServer._SCHEMA_TEMPLATES_TABLE}` "
+            f"WHERE `prefix` = '{prefix}'",
+        ):
+            return None
+
+        tables = TestServer.__prefixed_tables(
+            podman_client, database_container_name, prefix
+        )
+
+        constraints: dict[tuple[str, str], list[list[str]]] = {}
+        for row in TestServer.__query_sql(
+            podman_client,
+            database_container_name,
+            "SELECT k.TABLE_NAME, k.CONSTRAINT_NAME, k.COLUMN_NAME, "
+            "k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME, "
+            "r.UPDATE_RULE, r.DELETE_RULE "
+            "FROM information_schema.KEY_COLUMN_USAGE k "
+            "JOIN information_schema.REFERENTIAL_CONSTRAINTS r "
+            "ON r.CONSTRAINT_SCHEMA = k.CONSTRAINT_SCHEMA "
+            "AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME "
+            "AND r.TABLE_NAME = k.TABLE_NAME "
+            "WHERE k.TABLE_SCHEMA = 'servatrice' "
+            "AND k.REFERENCED_TABLE_NAME IS NOT NULL "
+            f"AND LEFT(k.TABLE_NAME, {len(prefix) + 1}) = '{prefix}_' "
+            "ORDER BY k.TABLE_NAME, k.CONSTRAINT_NAME, k.ORDINAL_POSITION",
+        ):
+            constraints.setdefault((row[0], row[1]), []).append(row)
+
+        foreign_keys = []
+        for rows in constraints.values():
+            table, _, _, referenced_table, _, on_update, on_delete = rows[0]
+            foreign_keys.append(
+                (
+                    table[len(prefix) + 1 :],
+                    ", ".join(f"`{row[2]}`" for row in rows),
+                    referenced_table[len(prefix) + 1 :],
+                    ", ".join(f"`{row[4]}`" for row in rows),
+                    on_update,
+                    on_delete,
+                )
+            )
+
+        return TestServer._SchemaTemplate(prefix, tables, foreign_keys)
+
+    @staticmethod
+    def __run_sql(
+        podman_client: podman.PodmanClient,
+        database_container_name: str,
+        statements: str | Iterable[str],
+        database: str = None,
+    ):
+        database_container = podman_client.containers.get(
+            database_container_name
         )
 
-        fixed_sql = rendered_sql.replace("`", "\\`").replace('"', '\\"')
-        sql_command = f'/bin/bash -c "mysql <<EOF\n{fixed_sql}\nEOF"'
-        TestServer.Logger.log("Building database...")
-        database_container.exec_run(
-            cmd=sql_command,
-            user="root",
+        _, errors = sql.execute(database_container, statements, database)
+        if errors:
+            error = sql.SqlExecutionError(errors)
+            TestServer.Logger.log(str(error), TestServer.Logger.Level.ERROR)
+            raise error
+
+    @staticmethod
+    def __query_sql(
+        podman_client: podman.PodmanClient,
+        database_container_name: str,
+        query: str,
+    ) -> list[list[str]]:
+        database_container = podman_client.containers.get(
+            database_container_name
         )
 
+        try:
+            return sql.query(database_container, query)
+        except sql.SqlExecutionError as error:
+            TestServer.Logger.log(str(error), TestServer.Logger.Level.ERROR)
+            raise
+
     def __start_server(self, podman_client, rendered_ini):
         volumes = {}
 
@@ -531,7 +1300,7 @@ class TestServer:
                 f"Starting {self.container_name} container with logging at {self.log_path}..."
             )
             volumes[self.log_path] = {
-                "bind": "/var/log/servatrice",
+                "bind": posixpath.dirname(self._log_file),
                 "mode": "rw",
             }
         else:
@@ -540,39 +1309,836 @@ class TestServer:
             )
 
         if not podman_client.containers.exists(self.container_name):
-            podman_client.containers.create(
-                image=TestServer._BASE_SERVER_NAME,
-                auto_remove=True,
-                detach=True,
-                hostname=self.container_name,
-                name=self.container_name,
-                network=TestServer._NETWORK_NAME,
-                network_mode="bridge",
-                ports={
-                    "4747/tcp": self.tcp_port,
-                    "4748/tcp": self.websocket_port,
-                },
-                volumes=volumes,
-            )
+            with TestServer.Logger.span(
+                "server.create", server=self.server_identifier
+            ):
+                podman_client.containers.create(
+                    image=TestServer._BASE_SERVER_NAME,
+                    auto_remove=True,
+                    detach=True,
+                    hostname=self.container_name,
+                    name=self.container_name,
+                    network=TestServer._NETWORK_NAME,
+                    network_mode="bridge",
+                    ports={
+                        "4747/tcp": self.tcp_port,
+                        "4748/tcp": self.websocket_port,
+                    },
+                    volumes=volumes,
+                    labels={
+                        TestServer._ROLE_LABEL: TestServer._SERVER_ROLE,
+                        TestServer._IDENTIFIER_LABEL: self.server_identifier,
+                        TestServer._OWNER_LABEL: TestServer._OWNER,
+                        TestServer._TCP_PORT_LABEL: str(self.tcp_port),
+                        TestServer._WEBSOCKET_PORT_LABEL: str(
+                            self.websocket_port
+                        ),
+                        TestServer._DATABASE_LABEL: self.database_container_name,
+                    },
+                )
 
         server_container = podman_client.containers.get(self.container_name)
-        server_container.start()
 
-        fixed_ini = rendered_ini.replace('"', '\\"')
+        # The configuration is copied into the created container before it
+        # starts, so servatrice can be launched right away by the entry point.
         TestServer.Logger.log(
             "Writing servatrice configuration file to the container..."
         )
-        config_command = f'/bin/bash -c "cat <<EOF > /home/servatrice/config/testatrice.ini\n{fixed_ini}\nEOF"'
-        server_container.exec_run(
-            cmd=config_command,
-            user="root",
-        )
+        with TestServer.Logger.span(
+            "server.config", server=self.server_identifier
+        ):
+            written = server_container.put_archive(
+                "/home/servatrice/config",
+                archives.archive_file("testatrice.ini", rendered_ini),
+            )
+        if not written:
+            message = f"Could not write the configuration file to {self.container_name}."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise RuntimeError(message)
+
+        self._container_started_at = time.monotonic()
+        with TestServer.Logger.span(
+            "server.start", server=self.server_identifier
+        ):
+            server_container.start()
+
+    def _wait_until_ready(self, podman_client: podman.PodmanClient):
+        """
+        Waits until servatrice in the container of this testatrice-server
+        instance is ready, as detected by ``readiness_probe``, and records
+        ``time_to_ready``.
+        """
+        from . import readiness
 
         TestServer.Logger.log(
-            "Sleeping for 1 second for the server to start..."
+            f"Waiting for {self.container_name} to be ready ({self.readiness_probe.value} probe)..."
         )
-        # TODO: change this to a loop with a ping when it can be done in crow
-        time.sleep(1)
+
+        match self.readiness_probe:
+            case TestServer.ReadinessProbe.TCP:
+                ready = readiness.wait_until(
+                    lambda: readiness.probe_tcp("localhost", self.tcp_port),
+                    self.readiness_timeout,
+                )
+            case TestServer.ReadinessProbe.WEBSOCKET:
+                ready = readiness.wait_until(
+                    lambda: readiness.probe_websocket(
+                        "localhost", self.websocket_port
+                    ),
+                    self.readiness_timeout,
+                )
+            case TestServer.ReadinessProbe.LOG:
+                ready = self.__wait_for_listening_log(podman_client)
+
+        self._record_readiness(ready)
+
+    def _record_readiness(self, ready: bool):
+        if not ready:
+            message = f"Test server {self.server_identifier} was not ready after {self.readiness_timeout} seconds."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise TimeoutError(message)
+
+        self.time_to_ready = time.monotonic() - self._container_started_at
+        TestServer.Logger.log(
+            "server.ready",
+            duration=self.time_to_ready,
+            server=self.server_identifier,
+            probe=self.readiness_probe.value,
+        )
+
+    def __wait_for_listening_log(
+        self, podman_client: podman.PodmanClient
+    ) -> bool:
+        return (
+            self._wait_for_log(
+                podman_client,
+                TestServer._LISTENING_LOG_PATTERN,
+                self.readiness_timeout,
+                offset=self._log_offset,
+            )
+            is not None
+        )
+
+    @staticmethod
+    def _wait_for_pattern(
+        response: podman.api.client.APIResponse,
+        pattern: re.Pattern,
+        timeout: float,
+    ) -> bool:
+        """
+        Reads the multiplexed log stream of ``response`` in a background
+        thread until a line matches ``pattern``. Returns False if no line
+        matched within ``timeout`` seconds. The response is closed and the
+        thread joined in both cases.
+        """
+        from podman import api
+
+        matched = threading.Event()
+
+        def follow():
+            buffer = ""
+            try:
+                for chunk in api.stream_frames(response):
+                    buffer += chunk.decode(errors="replace")
+                    *lines, buffer = buffer.split("\n")
+                    if any(pattern.search(line) for line in lines):
+                        matched.set()
+                        return
+            except Exception:
+                # The stream was closed by the waiting thread.
+                pass
+
+        thread = threading.Thread(target=follow, daemon=True)
+        thread.start()
+        try:
+            return matched.wait(timeout)
+        finally:
+            streams.shutdown(response)
+            thread.join(streams.JOIN_TIMEOUT)
+            if thread.is_alive():
+                # Closing the response would wait for the blocked reader.
+                TestServer.Logger.log(
+                    "The database log stream could not be closed.",
+                    TestServer.Logger.Level.WARNING,
+                )
+            else:
+                response.close()
+
+    def logs(
+        self,
+        follow: bool = False,
+        since: datetime = None,
+        offset: int = 0,
+    ) -> Iterator[logfiles.LogLine]:
+        """
+        Yields the lines of the servatrice log of this testatrice-server
+        instance, read from the container, so ``log_path`` does not need to
+        be set.
+
+        The log is streamed and split into lines as it arrives, so reading
+        it does not load the whole file and following it does not poll.
+        Every line has the byte offset to pass as ``offset`` to read only
+        the lines after it later on.
+
+        Arguments:
+            follow (bool): Set to True to wait for new lines after the end
+              of the log, until the server stops or the iterator is closed.
+            since (datetime): Skip the lines logged before this time, in the
+              time zone of the container (UTC).
+            offset (int): The byte offset to start from, such as the
+              ``next_offset`` of the last line read.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            RuntimeError: If a container using this same identifier does not
+              exist.
+        """
+        with TestServer.__connection(self._session) as podman_client:
+            yield from self._logs(
+                podman_client, follow=follow, since=since, offset=offset
+            )
+
+    def _logs(
+        self,
+        podman_client: podman.PodmanClient,
+        follow: bool = False,
+        since: datetime = None,
+        offset: int = 0,
+        started: Callable[[Callable[[], None]], None] = None,
+    ) -> Iterator[logfiles.LogLine]:
+        """
+        Yields the lines of the servatrice log using ``podman_client``. See
+        ``logfiles.read`` for ``started``.
+        """
+        server_container = self.__get_server_container(podman_client)
+        yield from logfiles.read(
+            server_container,
+            self._log_file,
+            follow=follow,
+            since=since,
+            offset=offset,
+            started=started,
+        )
+
+    def wait_for_log(
+        self,
+        pattern: str | re.Pattern,
+        timeout: float = 30,
+        offset: int = 0,
+    ) -> logfiles.LogLine:
+        """
+        Waits until a line of the servatrice log of this testatrice-server
+        instance matches ``pattern`` and returns it. Lines already in the
+        log match too, so pass the ``next_offset`` of a previous line to only
+        wait for new ones.
+
+        Arguments:
+            pattern (str | re.Pattern): The regular expression searched in
+              every line.
+            timeout (float): The maximum number of seconds to wait.
+            offset (int): The byte offset of the log to start from.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            RuntimeError: If a container using this same identifier does not
+              exist.
+            TimeoutError: If no line matched within ``timeout`` seconds.
+        """
+        with TestServer.__connection(self._session) as podman_client:
+            line = self._wait_for_log(
+                podman_client, re.compile(pattern), timeout, offset=offset
+            )
+
+        if line is None:
+            message = f"No line of the {self.server_identifier} log matched {pattern!r} within {timeout} seconds."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise TimeoutError(message)
+
+        return line
+
+    def _wait_for_log(
+        self,
+        podman_client: podman.PodmanClient,
+        pattern: re.Pattern,
+        timeout: float,
+        offset: int = 0,
+    ) -> logfiles.LogLine | None:
+        """
+        Returns the first line of the servatrice log after ``offset`` that
+        matches ``pattern``, or None if none did within ``timeout`` seconds.
+        """
+        server_container = self.__get_server_container(podman_client)
+
+        # tail is stopped by the container after the timeout, so the lines
+        # are read in this thread without a deadline of their own.
+        lines = logfiles.read(
+            server_container,
+            self._log_file,
+            follow=True,
+            offset=offset,
+            duration=timeout,
+        )
+        try:
+            for line in lines:
+                if pattern.search(line.text):
+                    return line
+        finally:
+            lines.close()
+
+        return None
+
+    def __get_server_container(
+        self, podman_client: podman.PodmanClient
+    ) -> podman.domain.containers.Container:
+        if not podman_client.containers.exists(self.container_name):
+            message = f"No test server with identifier {self.server_identifier} exists."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise RuntimeError(message)
+
+        return podman_client.containers.get(self.container_name)
+
+    def sample_resources(
+        self, interval: int = 1, capacity: int = 3600
+    ) -> resources.ResourceSampler:
+        """
+        Starts sampling the CPU, memory, network I/O and block I/O of this
+        testatrice-server instance, of its database and of the mail server
+        every ``interval`` seconds, and returns the sampler. Comparing them
+        tells whether a slowdown comes from servatrice or from the shared
+        database. Call ``stop`` on the sampler, or use it as a context
+        manager, to stop sampling.
+
+        Arguments:
+            interval (int): The number of seconds between samples, at
+              least 1.
+            capacity (int): The number of samples kept per container; older
+              ones are overwritten.
+
+        Raises:
+            ValueError: If ``interval`` or ``capacity`` is lower than 1.
+        """
+        sampler = resources.ResourceSampler(
+            [
+                self.container_name,
+                self.database_container_name,
+                TestServer._MAILSERVER_NAME,
+            ],
+            interval=interval,
+            capacity=capacity,
+            client_arguments=(
+                self._session._client_arguments
+                if self._session is not None
+                else None
+            ),
+        )
+        sampler.start()
+
+        return sampler
+
+    def execute_sql(
+        self,
+        statements: str | Iterable[str],
+        batch_size: int = 1000,
+        check: bool = True,
+    ) -> tuple[str, list[sql.SqlError]]:
+        """
+        Runs SQL statements in the ``servatrice`` database used by this
+        testatrice-server instance. Its tables are named
+        ``[server_identifier]_[table]``.
+
+        Statements are uploaded to the database container and sent in
+        batches, one exec per batch, so large payloads (for example to seed
+        data) do not need any quoting and can be generated lazily.
+
+        Arguments:
+            statements (str | Iterable[str]): An SQL script, or an iterable of
+              single statements without the trailing semicolon.
+            batch_size (int): The maximum number of statements per batch.
+            check (bool): Set to False to return the errors instead of
+              raising them.
+
+        Returns:
+            The output of the statements, in tab separated format, and the
+            list of errors (empty when ``check`` is True).
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            SqlExecutionError: If ``check`` is True and any statement
+              failed. Every failing statement is reported.
+        """
+        with TestServer.__connection(self._session) as podman_client:
+            database_container = podman_client.containers.get(
+                self.database_container_name
+            )
+            output, errors = sql.execute(
+                database_container,
+                statements,
+                database="servatrice",
+                batch_size=batch_size,
+            )
+
+        if errors and check:
+            error = sql.SqlExecutionError(errors)
+            TestServer.Logger.log(str(error), TestServer.Logger.Level.ERROR)
+            raise error
+
+        return output, errors
+
+    def seed_database(
+        self,
+        plan: seeding.SeedPlan = seeding.SeedPlan(),
+        seed: int = 0,
+        password: str = "password",
+        rows_per_statement: int = 1000,
+    ) -> dict[str, int]:
+        """
+        Fills the tables of this testatrice-server instance with generated
+        users, buddy and ignore lists, games and their players, replays,
+        sessions, chat logs and bans, so that lookups are measured against
+        realistic volumes rather than an empty database.
+
+        Rows are generated lazily and sent as multi-row INSERTs in large
+        batches with foreign and unique key checks disabled, so memory use
+        is bounded and millions of rows take seconds to minutes. The same
+        ``plan`` and ``seed`` always generate the same rows. Seeded users
+        are named ``user[id]`` and follow the existing rows, so a database
+        can be seeded more than once.
+
+        Arguments:
+            plan (SeedPlan): The number of rows of every table.
+            seed (int): The seed of the generated values.
+            password (str): The password of every seeded user.
+            rows_per_statement (int): The number of rows per INSERT.
+
+        Returns:
+            The number of rows inserted per table.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            SqlExecutionError: If any statement failed.
+        """
+        counts = {}
+        with (
+            TestServer.Logger.span(
+                "database.seed", server=self.server_identifier
+            ) as fields,
+            TestServer.__connection(self._session) as podman_client,
+        ):
+            database_container = podman_client.containers.get(
+                self.database_container_name
+            )
+            [[last_user_id, last_game_id]] = sql.query(
+                database_container,
+                f"SELECT (SELECT COALESCE(MAX(id), 0) FROM `{self.server_identifier}_users`), "
+                f"(SELECT COALESCE(MAX(id), 0) FROM `{self.server_identifier}_games`)",
+                database="servatrice",
+            )
+            _, errors = sql.execute(
+                database_container,
+                seeding.statements(
+                    self.server_identifier,
+                    plan,
+                    int(last_user_id) + 1,
+                    int(last_game_id) + 1,
+                    passwords.password_hash(password),
+                    seed=seed,
+                    rows_per_statement=rows_per_statement,
+                    counts=counts,
+                ),
+                database="servatrice",
+                preamble=seeding.PREAMBLE,
+            )
+            fields["rows"] = sum(counts.values())
+
+        if errors:
+            error = sql.SqlExecutionError(errors)
+            TestServer.Logger.log(str(error), TestServer.Logger.Level.ERROR)
+            raise error
+
+        return counts
+
+    def query_sql(self, query: str) -> list[list[str]]:
+        """
+        Runs a single query in the ``servatrice`` database used by this
+        testatrice-server instance and returns the resulting rows as lists of
+        strings.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            SqlExecutionError: If the query failed.
+        """
+        with TestServer.__connection(self._session) as podman_client:
+            database_container = podman_client.containers.get(
+                self.database_container_name
+            )
+            return sql.query(database_container, query, database="servatrice")
+
+    def reset(self, restart: bool = True):
+        """
+        Restores the database tables of this testatrice-server instance to
+        their state right after ``start``: every table is emptied and the
+        rows inserted by the SQL template (such as the ``Admin`` user) are
+        inserted again, in a single database round trip.
+
+        Arguments:
+            restart (bool): Set to False to keep servatrice running. It keeps
+              in memory state such as connected users, rooms and games, so
+              it is restarted in place by default, without recreating the
+              container.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            RuntimeError: If this instance was not started or its container
+              is not running.
+            TimeoutError: If servatrice is not ready within
+              ``readiness_timeout`` seconds after the restart.
+        """
+        with TestServer.__connection(self._session) as podman_client:
+            self._reset(podman_client, restart=restart)
+            if restart:
+                self._wait_until_ready(podman_client)
+
+    def _reset(self, podman_client: podman.PodmanClient, restart: bool):
+        """
+        Resets the database of this testatrice-server instance and, if
+        ``restart`` is set, restarts its container using ``podman_client``,
+        without waiting for servatrice to start.
+        """
+        server_container = self.__get_running_server_container(podman_client)
+
+        TestServer.Logger.log(
+            f"Resetting {self.server_identifier} database..."
+        )
+        with TestServer.Logger.span(
+            "database.reset", server=self.server_identifier
+        ):
+            TestServer.__run_sql(
+                podman_client,
+                self.database_container_name,
+                self._reset_statements,
+            )
+
+        if restart:
+            self.__restart(server_container)
+
+    def __get_running_server_container(
+        self, podman_client: podman.PodmanClient
+    ) -> podman.domain.containers.Container:
+        if self._reset_statements is None:
+            message = f"Test server {self.server_identifier} was not started."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise RuntimeError(message)
+
+        if not podman_client.containers.exists(self.container_name):
+            message = f"No test server with identifier {self.server_identifier} exists."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise RuntimeError(message)
+
+        server_container = podman_client.containers.get(self.container_name)
+
+        if server_container.status != "running":
+            message = f"No test server with identifier {self.server_identifier} is running."
+            TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
+            raise RuntimeError(message)
+
+        return server_container
+
+    def __restart(self, server_container: podman.domain.containers.Container):
+        if self.readiness_probe == TestServer.ReadinessProbe.LOG:
+            # Only look for the listening line written after the restart.
+            exit_code, (output, _) = server_container.exec_run(
+                cmd=[
+                    "stat",
+                    "-c",
+                    "%s",
+                    self._log_file,
+                ],
+                demux=True,
+            )
+            output = (output or b"").strip()
+            self._log_offset = (
+                int(output) if exit_code == 0 and output.isdigit() else 0
+            )
+
+        TestServer.Logger.log(f"Restarting {self.container_name}...")
+        self._container_started_at = time.monotonic()
+        server_container.restart(timeout=0)
+
+    def snapshot(self, name: str, cache: bool = False):
+        """
+        Saves the content of all the database tables of this
+        testatrice-server instance as the snapshot ``name``, replacing any
+        snapshot with the same name, so that an expensive state (for
+        example a large seeded dataset) can be restored with ``restore``
+        instead of being rebuilt.
+
+        The snapshot is a copy of the tables in the same database, under a
+        prefix which only depends on ``name``, so it can be restored to any
+        server using the same database and SQL template. It is copied in a
+        single database round trip, within a consistent transaction.
+
+        Arguments:
+            name (str): The name of the snapshot: 1 to 128 letters, digits,
+              dots, dashes or underscores.
+            cache (bool): Set to True to also dump the snapshot to
+              ``~/.cache/testatrice/snapshots``, so it can be restored after
+              the environment is destroyed or to a server using another
+              database shard.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            ValueError: If ``name`` is not a valid snapshot name.
+            RuntimeError: If this instance was not started, or the dump
+              failed.
+            SqlExecutionError: If copying the tables failed.
+        """
+        TestServer.__validate_snapshot_name(name)
+        snapshot_prefix = snapshots.prefix(name)
+
+        with TestServer.__connection(self._session) as podman_client:
+            self.__get_running_server_container(podman_client)
+            tables = TestServer.__prefixed_tables(
+                podman_client,
+                self.database_container_name,
+                self.server_identifier,
+            )
+
+            statements = [
+                "USE `servatrice`",
+                f"""CREATE TABLE IF NOT EXISTS `{TestServer._SNAPSHOTS_TABLE}` (
+  `name` varchar(128) NOT NULL,
+  `prefix` varchar(64) NOT NULL,
+  PRIMARY KEY (`name`)
+)""",
+            ]
+            # Tables of an older snapshot with the same name, which may not
+            # have the same tables.
+            for table in set(tables) | set(
+                TestServer.__prefixed_tables(
+                    podman_client,
+                    self.database_container_name,
+                    snapshot_prefix,
+                )
+            ):
+                statements.append(
+                    f"DROP TABLE IF EXISTS `{snapshot_prefix}_{table}`"
+                )
+            # Snapshot tables only store rows, so they have no foreign keys.
+            statements += [
+                f"CREATE TABLE `{snapshot_prefix}_{table}` "
+                f"LIKE `{self.server_identifier}_{table}`"
+                for table in tables
+            ]
+            statements.append("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            statements += [
+                f"INSERT INTO `{snapshot_prefix}_{table}` "
+                f"SELECT * FROM `{self.server_identifier}_{table}`"
+                for table in tables
+            ]
+            statements += [
+                f"REPLACE INTO `{TestServer._SNAPSHOTS_TABLE}` "
+                f"VALUES ('{name}', '{snapshot_prefix}')",
+                "COMMIT",
+            ]
+
+            TestServer.Logger.log(
+                f"Saving {self.server_identifier} database as snapshot {name}..."
+            )
+            with TestServer.Logger.span(
+                "database.snapshot",
+                server=self.server_identifier,
+                snapshot=name,
+            ) as fields:
+                TestServer.__run_sql(
+                    podman_client, self.database_container_name, statements
+                )
+
+                if cache:
+                    fields["cache"] = str(snapshots.cache_path(name))
+                    database_container = podman_client.containers.get(
+                        self.database_container_name
+                    )
+                    try:
+                        snapshots.dump(
+                            database_container,
+                            [f"{snapshot_prefix}_{table}" for table in tables],
+                            snapshots.cache_path(name),
+                        )
+                    except RuntimeError as error:
+                        TestServer.Logger.log(
+                            str(error), TestServer.Logger.Level.ERROR
+                        )
+                        raise
+
+    def restore(self, name: str, restart: bool = True):
+        """
+        Replaces the content of the database tables of this
+        testatrice-server instance with the snapshot ``name``, taken from
+        this or any other server by ``snapshot``, in a single database round
+        trip. If the database does not hold the snapshot, its cached dump is
+        loaded first.
+
+        Arguments:
+            name (str): The name of the snapshot.
+            restart (bool): Set to False to keep servatrice running. See
+              ``reset``.
+
+        Raises:
+            ConnectionError: If the podman service is not available. Run
+              ``podman system service -t 0 &`` to solve.
+            ValueError: If ``name`` is not a valid snapshot name, or no
+              snapshot with this name exists in the database or the cache.
+            RuntimeError: If this instance was not started or its container
+              is not running, or the cached dump could not be loaded.
+            SqlExecutionError: If copying the tables failed, for example
+              because the snapshot was taken from a server with another SQL
+              template.
+            TimeoutError: If servatrice is not ready within
+              ``readiness_timeout`` seconds after the restart.
+        """
+        with TestServer.__connection(self._session) as podman_client:
+            self._restore(podman_client, name, restart=restart)
+            if restart:
+                self._wait_until_ready(podman_client)
+
+    def _restore(
+        self, podman_client: podman.PodmanClient, name: str, restart: bool
+    ):
+        """
+        Restores the snapshot ``name`` in the database of this
+        testatrice-server instance and, if ``restart`` is set, restarts its
+        container using ``podman_client``, without waiting for servatrice to
+        start.
+        """
+        TestServer.__validate_snapshot_name(name)
+        snapshot_prefix = snapshots.prefix(name)
+        server_container = self.__get_running_server_container(podman_client)
+
+        with TestServer.Logger.span(
+            "database.restore", server=self.server_identifier, snapshot=name
+        ) as fields:
+            tables = TestServer.__snapshot_tables(
+                podman_client, self.database_container_name, name
+            )
+            if tables is None:
+                path = snapshots.cache_path(name)
+                if not path.exists():
+                    message = f"No snapshot named {name} exists in {self.database_container_name} or in {path.parent}."
+                    TestServer.Logger.log(
+                        message, TestServer.Logger.Level.ERROR
+                    )
+                    raise ValueError(message)
+
+                TestServer.Logger.log(
+                    f"Loading snapshot {name} from {path}..."
+                )
+                fields["cache"] = str(path)
+                try:
+                    snapshots.load(
+                        podman_client.containers.get(
+                            self.database_container_name
+                        ),
+                        path,
+                    )
+                except RuntimeError as error:
+                    TestServer.Logger.log(
+                        str(error), TestServer.Logger.Level.ERROR
+                    )
+                    raise
+                tables = TestServer.__prefixed_tables(
+                    podman_client,
+                    self.database_container_name,
+                    snapshot_prefix,
+                )
+                TestServer.__run_sql(
+                    podman_client,
+                    self.database_container_name,
+                    f"REPLACE INTO `{TestServer._SNAPSHOTS_TABLE}` "
+                    f"VALUES ('{name}', '{snapshot_prefix}')",
+                    database="servatrice",
+                )
+
+            TestServer.Logger.log(
+                f"Restoring snapshot {name} in {self.server_identifier} database..."
+            )
+            TestServer.__run_sql(
+                podman_client,
+                self.database_container_name,
+                ["USE `servatrice`", "SET FOREIGN_KEY_CHECKS = 0"]
+                + [
+                    statement
+                    for table in tables
+                    for statement in (
+                        f"TRUNCATE TABLE `{self.server_identifier}_{table}`",
+                        f"INSERT INTO `{self.server_identifier}_{table}` "
+                        f"SELECT * FROM `{snapshot_prefix}_{table}`",
+                    )
+                ]
+                + ["SET FOREIGN_KEY_CHECKS = 1"],
+            )
+
+        if restart:
+            self.__restart(server_container)
+
+    @staticmethod
+    def __validate_snapshot_name(name: str):
+        try:
+            snapshots.validate_name(name)
+        except ValueError as error:
+            TestServer.Logger.log(str(error), TestServer.Logger.Level.ERROR)
+            raise
+
+    @staticmethod
+    def __snapshot_tables(
+        podman_client: podman.PodmanClient,
+        database_container_name: str,
+        name: str,
+    ) -> list[str] | None:
+        if not TestServer.__query_sql(
+            podman_client,
+            database_container_name,
+            "SELECT 1 FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = 'servatrice' "
+            f"AND TABLE_NAME = '{TestServer._SNAPSHOTS_TABLE}'",
+        ) or not TestServer.__query_sql(
+            podman_client,
+            database_container_name,
+            f"SELECT 1 FROM `servatrice`.`{TestServer._SNAPSHOTS_TABLE}` "
+            f"WHERE `name` = '{name}'",
+        ):
+            return None
+
+        return TestServer.__prefixed_tables(
+            podman_client, database_container_name, snapshots.prefix(name)
+        )
+
+    @staticmethod
+    def __prefixed_tables(
+        podman_client: podman.PodmanClient,
+        database_container_name: str,
+        prefix: str,
+    ) -> list[str]:
+        """
+        Returns the names, without ``prefix``, of the tables named
+        ``[prefix]_[table]`` in the ``servatrice`` database.
+        """
+        return [
+            row[0][len(prefix) + 1 :]
+            for row in TestServer.__query_sql(
+                podman_client,
+                database_container_name,
+                "SELECT TABLE_NAME FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = 'servatrice' "
+                f"AND LEFT(TABLE_NAME, {len(prefix) + 1}) = '{prefix}_'",
+            )
+        ]
 
     def stop(self):
         """
@@ -584,15 +2150,18 @@ class TestServer:
             RuntimeError: If a container using this same identifier does not
               exist or is not running.
         """
-        with podman.PodmanClient() as podman_client:
-            if not podman_client.ping():
-                message = "The podman service did not respond."
-                TestServer.Logger.log(message)
-                raise ConnectionError(message)
+        with TestServer.__connection(self._session) as podman_client:
+            self._stop(podman_client)
 
+    def _stop(self, podman_client: podman.PodmanClient):
+        """
+        Stops the container of this testatrice-server instance using
+        ``podman_client``.
+        """
+        try:
             if not podman_client.containers.exists(self.container_name):
                 message = f"No test server with identifier {self.server_identifier} exists."
-                TestServer.Logger.log(message)
+                TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
                 raise RuntimeError(message)
 
             server_container = podman_client.containers.get(
@@ -601,19 +2170,44 @@ class TestServer:
 
             if server_container.status != "running":
                 message = f"No test server with identifier {self.server_identifier} is running."
-                TestServer.Logger.log(message)
+                TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
                 raise RuntimeError(message)
 
             TestServer.Logger.log(
                 f"Stopping {self.server_identifier} container..."
             )
             server_container.stop()
+        finally:
+            self._release_ports()
+
+    def _abort_start(self, podman_client: podman.PodmanClient):
+        """
+        Stops the container of this testatrice-server instance using
+        ``podman_client`` after it failed to get ready, and releases its
+        ports. Errors are logged, so they do not hide the failure.
+        """
+        try:
+            if podman_client.containers.exists(self.container_name):
+                podman_client.containers.get(self.container_name).stop()
+        except Exception as exception:
+            TestServer.Logger.log(
+                f"Could not stop {self.container_name}: {exception}",
+                TestServer.Logger.Level.WARNING,
+            )
+        finally:
+            self._release_ports()
 
     @staticmethod
-    def stop_server(server_identifier: str):
+    def stop_server(
+        server_identifier: str, session: "TestServer.Session" = None
+    ):
         """
         Stops this testatrice-server instance.
 
+        Arguments:
+            session (Session): The podman connection to use. If None, a
+              connection is opened for this call only.
+
         Raises:
             ConnectionError: If the podman service is not available. Run
               ``podman system service -t 0 &`` to solve.
@@ -622,159 +2216,570 @@ class TestServer:
         """
         container_name = TestServer._BASE_SERVER_NAME + "-" + server_identifier
 
-        with podman.PodmanClient() as podman_client:
-            if not podman_client.ping():
-                message = "The podman service did not respond."
-                TestServer.Logger.log(message)
-                raise ConnectionError(message)
-
+        with TestServer.__connection(session) as podman_client:
             if not podman_client.containers.exists(container_name):
                 message = f"No test server with identifier {server_identifier} exists."
-                TestServer.Logger.log(message)
+                TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
                 raise RuntimeError(message)
 
             server_container = podman_client.containers.get(container_name)
 
             if server_container.status != "running":
                 message = f"No test server with identifier {server_identifier} is running."
-                TestServer.Logger.log(message)
+                TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
                 raise RuntimeError(message)
 
             TestServer.Logger.log(f"Stopping {container_name} container...")
             server_container.stop()
+            TestServer.__release_container_ports(server_container)
 
     @staticmethod
-    def destroy_environment() -> None:
+    def destroy_environment(
+        session: "TestServer.Session" = None,
+        stop_timeout: int = _STOP_TIMEOUT,
+        owned_only: bool = False,
+    ) -> None:
         """
-        Stops all testatrice containers, including ``testatrice-database``
-        and ``testatrice-mailserver``.
+        Stops all testatrice containers, including every database shard and
+        ``testatrice-mailserver``.
+
+        Arguments:
+            session (Session): The podman connection to use. If None, a
+              connection is opened for this call only.
+            stop_timeout (int): The number of seconds each container is
+              given to stop before it is killed. 0 kills them right away.
+            owned_only (bool): Set to True to only stop the server containers
+              started by this process. The environment containers are
+              stopped anyway.
 
         Raises:
             ConnectionError: If the podman service is not available. Run
               ``podman system service -t 0 &`` to solve.
         """
-        TestServer.stop_all_server_containers()
+        with TestServer.__connection(session) as podman_client:
+            TestServer._destroy_environment(
+                podman_client, stop_timeout=stop_timeout, owned_only=owned_only
+            )
 
-        with podman.PodmanClient() as podman_client:
-            if not podman_client.ping():
-                message = "The podman service did not respond."
-                TestServer.Logger.log(message)
-                raise ConnectionError(message)
+        if session is not None:
+            session.invalidate()
 
-            if podman_client.containers.exists(TestServer._MAILSERVER_NAME):
-                mailserver_container = podman_client.containers.get(
-                    TestServer._MAILSERVER_NAME
-                )
+    @staticmethod
+    def _destroy_environment(
+        podman_client: podman.PodmanClient,
+        stop_timeout: int = _STOP_TIMEOUT,
+        owned_only: bool = False,
+    ) -> None:
+        TestServer._stop_all_server_containers(
+            podman_client, stop_timeout=stop_timeout, owned_only=owned_only
+        )
 
-                if mailserver_container.status == "running":
-                    TestServer.Logger.log(
-                        f"Stopping {TestServer._MAILSERVER_NAME} container..."
-                    )
-                    mailserver_container.stop()
-                else:
-                    TestServer.Logger.log(
-                        f"Container {TestServer._MAILSERVER_NAME} is not running. Skipping stop step."
-                    )
-            else:
+        environment_containers = []
+        for name in (
+            TestServer._MAILSERVER_NAME,
+            *TestServer.__database_shards(podman_client),
+        ):
+            if not podman_client.containers.exists(name):
                 TestServer.Logger.log(
-                    f"Container {TestServer._MAILSERVER_NAME} does not exist. Skipping stop step."
+                    f"Container {name} does not exist. Skipping stop step."
                 )
+                continue
 
-            if podman_client.containers.exists(TestServer._DATABASE_NAME):
-                database_container = podman_client.containers.get(
-                    TestServer._DATABASE_NAME
-                )
-
-                if database_container.status == "running":
-                    TestServer.Logger.log(
-                        f"Stopping {TestServer._DATABASE_NAME} container..."
-                    )
-                    database_container.stop()
-                else:
-                    TestServer.Logger.log(
-                        f"Container {TestServer._DATABASE_NAME} is not running. Skipping stop step."
-                    )
-            else:
+            container = podman_client.containers.get(name)
+            if container.status != "running":
                 TestServer.Logger.log(
-                    f"Container {TestServer._DATABASE_NAME} does not exist. Skipping stop step."
+                    f"Container {name} is not running. Skipping stop step."
                 )
+                continue
+
+            environment_containers.append(container)
+
+        TestServer.__stop_containers(environment_containers, stop_timeout)
 
     @staticmethod
-    def stop_all_server_containers() -> None:
+    def stop_all_server_containers(
+        session: "TestServer.Session" = None,
+        stop_timeout: int = _STOP_TIMEOUT,
+        owned_only: bool = False,
+    ) -> None:
         """
         Stops all testatrice containers, while keeping ``testatrice-database``
         and ``testatrice-mailserver`` running.
 
+        Server containers are found by their labels, or by their name for
+        containers without labels started by older versions, and stopped
+        concurrently.
+
+        Arguments:
+            session (Session): The podman connection to use. If None, a
+              connection is opened for this call only.
+            stop_timeout (int): The number of seconds each container is
+              given to stop before it is killed. 0 kills them right away.
+            owned_only (bool): Set to True to only stop the server containers
+              started by this process.
+
         Raises:
             ConnectionError: If the podman service is not available. Run
               ``podman system service -t 0 &`` to solve.
         """
+        with TestServer.__connection(session) as podman_client:
+            TestServer._stop_all_server_containers(
+                podman_client, stop_timeout=stop_timeout, owned_only=owned_only
+            )
+
+    @staticmethod
+    def _stop_all_server_containers(
+        podman_client: podman.PodmanClient,
+        stop_timeout: int = _STOP_TIMEOUT,
+        owned_only: bool = False,
+    ) -> None:
         TestServer.Logger.log("Stopping all server containers...")
+        labels = [f"{TestServer._ROLE_LABEL}={TestServer._SERVER_ROLE}"]
+        if owned_only:
+            labels.append(f"{TestServer._OWNER_LABEL}={TestServer._OWNER}")
+
+        server_containers = podman_client.containers.list(
+            filters={"label": labels, "status": "running"}
+        )
+        if not owned_only:
+            # Containers started by versions without labels are found by
+            # name. Their owner is unknown, so they are never owned.
+            server_containers += [
+                container
+                for container in podman_client.containers.list(
+                    filters={
+                        "name": f"^{TestServer._BASE_SERVER_NAME}-",
+                        "status": "running",
+                    }
+                )
+                if container.name.startswith(
+                    TestServer._BASE_SERVER_NAME + "-"
+                )
+                and TestServer._ROLE_LABEL not in (container.labels or {})
+            ]
+        TestServer.__stop_containers(server_containers, stop_timeout)
+        for server_container in server_containers:
+            TestServer.__release_container_ports(server_container)
+
+    @staticmethod
+    def __stop_containers(
+        containers: list[podman.domain.containers.Container],
+        stop_timeout: int,
+    ) -> None:
+        if not containers:
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        from podman import errors as podman_errors
+
+        def stop(container: podman.domain.containers.Container):
+            TestServer.Logger.log(f"Stopping {container.name} container...")
+            try:
+                container.stop(timeout=stop_timeout)
+            except podman_errors.NotFound:
+                # Stopped and removed in the meantime.
+                pass
+
+        with ThreadPoolExecutor(
+            max_workers=min(len(containers), TestServer._MAX_STOP_WORKERS),
+            thread_name_prefix="testatrice-stop",
+        ) as executor:
+            for future in [
+                executor.submit(stop, container) for container in containers
+            ]:
+                future.result()
+
+    @staticmethod
+    def __reserve_port(port: int = None) -> int:
+        if port is None:
+            return TestServer._port_allocator.reserve()
+
+        TestServer._port_allocator.reserve_port(port)
+        return port
+
+    @staticmethod
+    def __release_container_ports(
+        server_container: podman.domain.containers.Container,
+    ) -> None:
+        # Only the ports reserved by this process are actually released.
+        labels = server_container.labels or {}
+        for label in (
+            TestServer._TCP_PORT_LABEL,
+            TestServer._WEBSOCKET_PORT_LABEL,
+        ):
+            if label in labels:
+                TestServer._port_allocator.release(int(labels[label]))
+
+    def _release_ports(self) -> None:
+        """
+        Releases the ports reserved by this testatrice-server instance, so
+        they can be used by other servers.
+        """
+        TestServer._port_allocator.release(self.tcp_port)
+        TestServer._port_allocator.release(self.websocket_port)
+
+    @staticmethod
+    @contextmanager
+    def __connection(
+        session: "TestServer.Session" = None,
+    ) -> Iterator[podman.PodmanClient]:
+        if session is not None:
+            yield session.client
+            return
+
+        import podman
+
         with podman.PodmanClient() as podman_client:
             if not podman_client.ping():
                 message = "The podman service did not respond."
-                TestServer.Logger.log(message)
+                TestServer.Logger.log(message, TestServer.Logger.Level.ERROR)
                 raise ConnectionError(message)
 
-            all_containers = podman_client.containers.list()
+            yield podman_client
 
-            for container in all_containers:
-                if container.name.startswith(TestServer._BASE_SERVER_NAME):
-                    # This is weird, but for some reason container.status does
-                    # not work for the containers iterated from all_containers
-                    container = podman_client.containers.get(container.name)
-                    if container.status == "running":
-                        container.stop()
+    class Session:
+        """
+        A podman connection shared by any number of ``TestServer`` instances
+        and calls. The connection is opened on first use.
 
-    @staticmethod
-    def __create_identifier() -> str:
-        # TODO: it may be necessary to check that the identifier is unique on generation.
-        fake = Faker()
-        identifier = fake.word()
+        A successful ``TestServer.verify_environment`` is cached for
+        ``verification_ttl`` seconds, so starting many servers does not run
+        the verification, which execs into the database container, for each
+        one of them.
 
-        return identifier
+        It can be used as a context manager, which closes the connection on
+        exit. A closed session opens a new connection on next use.
 
-    @staticmethod
-    def __get_available_port() -> int:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.bind(("", 0))
-            port = sock.getsockname()[1]
-            return port
+        Arguments:
+            verification_ttl (float): The number of seconds a successful
+              environment verification is reused.
+            **client_arguments: Keyword arguments passed to
+              ``podman.PodmanClient``, such as ``base_url`` or
+              ``max_pool_size``.
+        """
 
-    @staticmethod
-    def __is_port_used(port: int) -> bool:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            try:
-                sock.bind(("", port))
-                return False
-            except socket.error as e:
-                if e.errno == errno.EADDRINUSE:
-                    return True
-                else:
-                    raise
+        def __init__(self, verification_ttl: float = 10, **client_arguments):
+            self.verification_ttl = verification_ttl
+            self._client_arguments = client_arguments
+            self._client: podman.PodmanClient = None
+            self._verified_at: float = None
+            self._lock = threading.Lock()
+            self._verification_lock = threading.Lock()
+
+        @property
+        def client(self) -> podman.PodmanClient:
+            """
+            The podman connection of this session, opened if necessary.
+
+            Raises:
+                ConnectionError: If the podman service is not available. Run
+                  ``podman system service -t 0 &`` to solve.
+            """
+            with self._lock:
+                if self._client is None:
+                    import podman
+
+                    podman_client = podman.PodmanClient(
+                        **self._client_arguments
+                    )
+                    if not podman_client.ping():
+                        podman_client.close()
+                        message = "The podman service did not respond."
+                        TestServer.Logger.log(
+                            message, TestServer.Logger.Level.ERROR
+                        )
+                        raise ConnectionError(message)
+                    self._client = podman_client
+
+                return self._client
+
+        def verify_environment(self) -> Tuple[bool, str]:
+            """
+            See ``TestServer.verify_environment``. Successful results are
+            reused for ``verification_ttl`` seconds.
+
+            Raises:
+                ConnectionError: If the podman service is not available. Run
+                  ``podman system service -t 0 &`` to solve.
+            """
+            podman_client = self.client
+            with self._verification_lock:
+                if (
+                    self._verified_at is not None
+                    and time.monotonic() - self._verified_at
+                    < self.verification_ttl
+                ):
+                    return True, "OK"
+
+                environment_ok, message = TestServer.verify_environment(
+                    podman_client
+                )
+                self._verified_at = (
+                    time.monotonic() if environment_ok else None
+                )
+
+                return environment_ok, message
+
+        def invalidate(self) -> None:
+            """
+            Discards the cached environment verification.
+            """
+            with self._verification_lock:
+                self._verified_at = None
+
+        def close(self) -> None:
+            """
+            Closes the podman connection of this session.
+            """
+            with self._lock:
+                podman_client = self._client
+                self._client = None
+
+            self.invalidate()
+            if podman_client is not None:
+                podman_client.close()
+
+        def __enter__(self) -> "TestServer.Session":
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback) -> None:
+            self.close()
 
     class Logger:
+        """
+        Records what testatrice does as structured events and, once enabled,
+        prints them.
+
+        Every message is an event, and every provisioning phase (image build,
+        database start, schema load, container create, configuration write,
+        readiness) is an event with a duration, recorded with ``span``.
+        Events are always recorded, in a bounded buffer holding the last
+        ``_MAX_EVENTS`` events, so the time spent in each phase can be
+        exported after the fact with ``export_json_lines`` or
+        ``export_chrome_trace``.
+        """
+
+        class Level(IntEnum):
+            DEBUG = 10
+            INFO = 20
+            WARNING = 30
+            ERROR = 40
+
+        class Event(NamedTuple):
+            """
+            Attributes:
+                name (str): The message or the name of the phase.
+                level (Level): The level of the event.
+                started_at (float): When the event happened or the phase
+                  started, in seconds since the epoch.
+                duration (float): The duration of the phase in seconds, or
+                  None for messages.
+                thread (str): The name of the thread that recorded it.
+                fields (dict): The context of the event, such as the server
+                  identifier or the image name.
+            """
+
+            name: str
+            level: "TestServer.Logger.Level"
+            started_at: float
+            duration: float | None
+            thread: str
+            fields: dict
+
+        _MAX_EVENTS: int = 100000
+
         _enabled = False
+        _level: Level = Level.INFO
+        _events: deque[Event] = deque(maxlen=_MAX_EVENTS)
 
         @staticmethod
-        def log(message: str | Iterator[bytes]) -> None:
-            if TestServer.Logger._enabled:
-                if message.__class__ == str:
-                    print(f"[{datetime.now()}] {message}")
-                else:  # Iterator from podman logs
+        def log(
+            message: str | Iterator[bytes],
+            level: Level = Level.INFO,
+            duration: float = None,
+            **fields,
+        ) -> None:
+            """
+            Records ``message`` and prints it if the logger is enabled at
+            ``level``. A ``duration``, in seconds, records a phase that just
+            ended, for phases not delimited by a single ``with`` block. The
+            output of a podman build is only decoded and printed at the
+            ``DEBUG`` level, and never recorded.
+            """
+            if message.__class__ != str:  # Iterator from podman logs
+                if TestServer.Logger.__prints(TestServer.Logger.Level.DEBUG):
                     for line in message:
                         print(
                             TestServer.Logger.__iterator_line_to_string(line),
                             end="",
                         )
+                return
+
+            started_at = time.time()
+            if duration is not None:
+                started_at -= duration
+            TestServer.Logger.__record(
+                message, level, started_at, duration, fields
+            )
+
+        @staticmethod
+        @contextmanager
+        def span(
+            name: str, level: Level = Level.INFO, **fields
+        ) -> Iterator[dict]:
+            """
+            Records the phase ``name`` with the duration of the ``with``
+            block. The yielded dictionary holds ``fields`` and can be
+            updated in the block. If the block raises, the exception is
+            recorded in the ``error`` field.
+            """
+            started_at = time.time()
+            started = time.perf_counter()
+            try:
+                yield fields
+            except BaseException as exception:
+                fields["error"] = repr(exception)
+                raise
+            finally:
+                TestServer.Logger.__record(
+                    name,
+                    level,
+                    started_at,
+                    time.perf_counter() - started,
+                    fields,
+                )
+
+        @staticmethod
+        def events() -> list[Event]:
+            """
+            Returns the recorded events, oldest first.
+            """
+            return list(TestServer.Logger._events)
+
+        @staticmethod
+        def clear() -> None:
+            """
+            Discards the recorded events.
+            """
+            TestServer.Logger._events.clear()
+
+        @staticmethod
+        def export_json_lines(path: str | os.PathLike) -> None:
+            """
+            Writes the recorded events to ``path``, one JSON object per line.
+            """
+            with open(path, "w") as file:
+                for event in TestServer.Logger.events():
+                    file.write(
+                        json.dumps(
+                            {
+                                "name": event.name,
+                                "level": event.level.name.lower(),
+                                "started_at": event.started_at,
+                                "duration": event.duration,
+                                "thread": event.thread,
+                                "fields": event.fields,
+                            },
+                            default=str,
+                        )
+                        + "\n"
+                    )
+
+        @staticmethod
+        def export_chrome_trace(path: str | os.PathLike) -> None:
+            """
+            Writes the recorded events to ``path`` in the Chrome trace event
+            format, which can be opened in Perfetto or ``chrome://tracing``.
+            Phases are drawn as slices on the row of their thread and
+            messages as instants.
+            """
+            # Thread ids must be numbers, so threads are numbered and named
+            # with metadata events.
+            thread_ids: dict[str, int] = {}
+            trace_events = []
+            for event in TestServer.Logger.events():
+                if event.thread not in thread_ids:
+                    thread_ids[event.thread] = len(thread_ids)
+                    trace_events.append(
+                        {
+                            "name": "thread_name",
+                            "ph": "M",
+                            "pid": os.getpid(),
+                            "tid": thread_ids[event.thread],
+                            "args": {"name": event.thread},
+                        }
+                    )
+
+                trace_event = {
+                    "name": event.name,
+                    "cat": event.level.name.lower(),
+                    "ts": event.started_at * 1e6,
+                    "pid": os.getpid(),
+                    "tid": thread_ids[event.thread],
+                    "args": event.fields,
+                }
+                if event.duration is None:
+                    trace_event.update(ph="i", s="t")
+                else:
+                    trace_event.update(ph="X", dur=event.duration * 1e6)
+                trace_events.append(trace_event)
+
+            with open(path, "w") as file:
+                json.dump(
+                    {"traceEvents": trace_events, "displayTimeUnit": "ms"},
+                    file,
+                    default=str,
+                )
+
+        @staticmethod
+        def __record(
+            name: str,
+            level: Level,
+            started_at: float,
+            duration: float | None,
+            fields: dict,
+        ) -> None:
+            # Appending to a deque is thread safe.
+            TestServer.Logger._events.append(
+                TestServer.Logger.Event(
+                    name,
+                    level,
+                    started_at,
+                    duration,
+                    threading.current_thread().name,
+                    fields,
+                )
+            )
+
+            if TestServer.Logger.__prints(level):
+                details = "".join(
+                    f" {key}={value}" for key, value in fields.items()
+                )
+                if duration is not None:
+                    details = f" ({duration:.3f} s){details}"
+                print(
+                    f"[{datetime.fromtimestamp(started_at)}] {name}{details}"
+                )
+
+        @staticmethod
+        def __prints(level: Level) -> bool:
+            return (
+                TestServer.Logger._enabled
+                and level >= TestServer.Logger._level
+            )
 
         @staticmethod
         def __iterator_line_to_string(line: bytes) -> str:
             return json.loads(line)["stream"]
 
         @staticmethod
-        def enable():
+        def enable(level: Level = Level.INFO):
+            """
+            Prints the events at ``level`` and above.
+            """
             TestServer.Logger._enabled = True
+            TestServer.Logger._level = level
 
         @staticmethod
         def disable():